@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Callable
+import threading
+import logging
+import asyncio
+
+
+class EngineNotRunningException(Exception):
+    pass
+
+
+class _Barrier:
+    def __init__(self, data: list, lanes_count: int, done: asyncio.Future):
+        self.data = data
+        self.pending = lanes_count
+        self.done = done
+
+
+class AsyncExecutionEngine:
+    def __init__(self, handler: Callable[[dict | list], None], max_in_flight: int):
+        self._handler = handler
+        self._max_in_flight = max(max_in_flight, 1)
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._executor = ThreadPoolExecutor(max_workers=self._max_in_flight, thread_name_prefix="engine")
+
+        self._lanes: dict[str, deque] = {}
+        self._lane_tasks: dict[str, asyncio.Task] = {}
+
+        self._started_event = threading.Event()
+
+        self._loop_thread = threading.Thread(target=self._run_loop)
+
+    @property
+    def lanes_count(self) -> int:
+        return len(self._lanes)
+
+    def start(self):
+        self._loop_thread.start()
+
+        self._started_event.wait()
+
+        logging.info(f"Async execution engine started, max in-flight: {self._max_in_flight}.")
+
+    def stop(self):
+        if self._loop is None or not self._loop_thread.is_alive():
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+            self._loop_thread.join()
+
+            self._executor.shutdown(wait=True)
+
+        logging.info("Async execution engine stopped.")
+
+    def submit(self, key: str, data: dict):
+        if self._loop is None or not self._loop_thread.is_alive():
+            raise EngineNotRunningException("Async execution engine is not running!")
+
+        self._loop.call_soon_threadsafe(self._enqueue, key, data)
+
+    def submit_many(self, keys: list[str], data: list):
+        if self._loop is None or not self._loop_thread.is_alive():
+            raise EngineNotRunningException("Async execution engine is not running!")
+
+        self._loop.call_soon_threadsafe(self._enqueue_barrier, list(dict.fromkeys(keys)), data)
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+
+        asyncio.set_event_loop(self._loop)
+
+        self._semaphore = asyncio.Semaphore(self._max_in_flight)
+
+        self._loop.call_soon(self._started_event.set)
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def _enqueue_barrier(self, keys: list[str], data: list):
+        barrier = _Barrier(data, len(keys), self._loop.create_future())
+
+        for key in keys:
+            self._enqueue(key, barrier)
+
+    def _enqueue(self, key: str, data: dict | _Barrier):
+        lane = self._lanes.get(key)
+
+        if lane is not None:
+            lane.append(data)
+
+            return
+
+        self._lanes[key] = deque([data])
+
+        self._lane_tasks[key] = self._loop.create_task(self._lane_worker(key))
+
+    async def _lane_worker(self, key: str):
+        lane = self._lanes[key]
+
+        while lane:
+            data = lane.popleft()
+
+            if isinstance(data, _Barrier):
+                data.pending -= 1
+
+                if data.pending > 0:
+                    await data.done
+
+                    continue
+
+                data, done = data.data, data.done
+            else:
+                done = None
+
+            async with self._semaphore:
+                try:
+                    await self._loop.run_in_executor(self._executor, self._handler, data)
+                except Exception as ex:
+                    logging.error(f"Unhandled error in lane '{key}': {ex.__class__.__name__} {ex}")
+
+            if done is not None:
+                done.set_result(None)
+
+        del self._lanes[key]
+        del self._lane_tasks[key]
+
+    async def _drain(self):
+        while self._lane_tasks:
+            await asyncio.gather(*self._lane_tasks.values(), return_exceptions=True)
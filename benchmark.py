@@ -0,0 +1,443 @@
+from tinkoff.invest import Quotation, Share, Future
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import threading
+import tempfile
+import argparse
+import requests
+import logging
+import urllib3
+import json
+import time
+import uuid
+import os
+
+import fake_broker
+import ring_buffer
+import metrics
+import logger
+import server
+import bot
+import cfg
+
+SIGNAL_TYPES = ["open", "renew_stop_loss", "close"]
+
+SIGNAL_STAGES = ["http", "to_broker", "post_order", "end_to_end"]
+
+
+def percentile(values: list[float], perc: float) -> float:
+    if not values:
+        return float("nan")
+
+    values = sorted(values)
+
+    return values[min(int(len(values) * perc / 100), len(values) - 1)]
+
+
+def format_latencies(name: str, latencies_s: list[float]) -> str:
+    return f"{name}: n={len(latencies_s)} " \
+           f"p50={percentile(latencies_s, 50) * 1000:.2f}ms " \
+           f"p99={percentile(latencies_s, 99) * 1000:.2f}ms " \
+           f"max={max(latencies_s, default=float('nan')) * 1000:.2f}ms"
+
+
+def run_ingress(url: str, requests_count: int, concurrency: int, payload: bytes | None) -> dict:
+    local = threading.local()
+
+    def fire(_):
+        session = getattr(local, "session", None)
+
+        if session is None:
+            session = local.session = requests.Session()
+
+        st = time.perf_counter()
+
+        try:
+            if payload is None:
+                response = session.get(url, verify=False, timeout=10)
+            else:
+                response = session.post(url, data=payload, verify=False, timeout=10)
+
+            is_ok = response.status_code == 200
+        except requests.RequestException:
+            is_ok = False
+
+        return time.perf_counter() - st, is_ok
+
+    st = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fire, range(requests_count)))
+
+    elapsed_s = time.perf_counter() - st
+
+    latencies_s = [latency_s for latency_s, is_ok in results if is_ok]
+
+    return {
+        "requests": requests_count,
+        "errors": requests_count - len(latencies_s),
+        "elapsed_s": elapsed_s,
+        "rps": len(latencies_s) / elapsed_s,
+        "latencies_s": latencies_s,
+    }
+
+
+class _RecordingTgLogger(logger.TgLogger):
+    def __init__(self):
+        super().__init__("", "")
+
+        self._messages: list[tuple[float, str]] = []
+        self._messages_changed = threading.Condition()
+
+    def send_tg(self, msg: str):
+        with self._messages_changed:
+            self._messages.append((time.perf_counter(), msg))
+
+            self._messages_changed.notify_all()
+
+    def send_tg_doc(self, caption: str, filename: str):
+        self.send_tg(caption)
+
+    def wait_for(self, predicate, timeout_s: float) -> list[tuple[float, str]]:
+        with self._messages_changed:
+            self._messages_changed.wait_for(lambda: predicate(self._messages), timeout=timeout_s)
+
+            return list(self._messages)
+
+
+def create_instruments(count: int,
+                       futures_count: int,
+                       currency: str,
+                       price: Decimal) -> tuple[list[Share | Future], dict[str, Decimal]]:
+    instruments = [Share(figi=f"BENCH{i:04d}",
+                         ticker=f"BNCH{i}",
+                         uid=uuid.uuid4().hex,
+                         name=f"Benchmark share {i}",
+                         currency=currency,
+                         lot=1,
+                         min_price_increment=Quotation(units=0, nano=10_000_000),
+                         dlong=Quotation(units=0, nano=300_000_000),
+                         dshort=Quotation(units=0, nano=300_000_000))
+                   for i in range(count)]
+
+    instruments += [Future(figi=f"BENCHF{i:04d}",
+                           ticker=f"BNCHF{i}",
+                           uid=uuid.uuid4().hex,
+                           name=f"Benchmark future {i}",
+                           currency=currency,
+                           lot=1,
+                           min_price_increment=Quotation(units=0, nano=10_000_000),
+                           min_price_increment_amount=Quotation(units=0, nano=20_000_000),
+                           dlong=Quotation(units=0, nano=150_000_000),
+                           dshort=Quotation(units=0, nano=150_000_000),
+                           expiration_date=datetime.now(timezone.utc) + timedelta(days=90))
+                    for i in range(futures_count)]
+
+    return instruments, {instrument.uid: price for instrument in instruments}
+
+
+def create_signal(signal_type: str, ticker: str, price: Decimal, comment: str) -> dict:
+    signal = {"type": signal_type, "ticker": f"MOEX:{ticker}", "position_side": "LONG", "comment": comment}
+
+    if signal_type == "open":
+        signal.update(qty=10, tp_price=str(price * Decimal("1.1")), sl_price=str(price * Decimal("0.9")))
+    elif signal_type == "renew_stop_loss":
+        signal.update(sl_price=str(price * Decimal("0.95")))
+
+    return signal
+
+
+def fire_signals(url: str, signals: list[dict], concurrency: int) -> list[tuple[float, float, bool]]:
+    local = threading.local()
+
+    def fire(signal):
+        session = getattr(local, "session", None)
+
+        if session is None:
+            session = local.session = requests.Session()
+
+        sent_at = time.perf_counter()
+
+        try:
+            is_ok = session.post(url, json=signal, verify=False, timeout=10).status_code == 200
+        except requests.RequestException:
+            is_ok = False
+
+        return sent_at, time.perf_counter() - sent_at, is_ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(fire, signals))
+
+
+def run_e2e(url: str,
+            broker: fake_broker.FakeBroker,
+            tg_logger: _RecordingTgLogger,
+            instruments: list[Share | Future],
+            price: Decimal,
+            rounds: int,
+            concurrency: int,
+            timeout_s: float,
+            batch: bool) -> dict[str, dict]:
+    uids = {instrument.ticker: instrument.uid for instrument in instruments}
+
+    results = {signal_type: {"signals": 0, "errors": 0, "elapsed_s": 0.0, "rpc_calls": 0,
+                             **{stage: [] for stage in SIGNAL_STAGES}}
+               for signal_type in SIGNAL_TYPES}
+
+    for round_index in range(rounds):
+        for signal_type in SIGNAL_TYPES:
+            prefix = f"bench-{round_index}-{signal_type}-"
+
+            signals = [create_signal(signal_type, ticker, price, f"{prefix}{ticker}") for ticker in uids]
+
+            st = time.perf_counter()
+
+            if batch:
+                fired = fire_signals(url, [signals], 1) * len(signals)
+            else:
+                fired = fire_signals(url, signals, concurrency)
+
+            expected = sum(1 for _, _, is_ok in fired if is_ok)
+
+            messages = tg_logger.wait_for(
+                lambda items: sum(1 for ts, msg in items if ts >= st and
+                                  (prefix in msg or msg.startswith("❌ Error occurred:"))) >= expected,
+                timeout_s)
+
+            finished_at = {}
+
+            for ts, msg in messages:
+                if ts < st or not msg.startswith("✅"):
+                    continue
+
+                for ticker in uids:
+                    if f"{prefix}{ticker}" in msg.split():
+                        finished_at[ticker] = ts
+
+            calls = broker.get_calls(st)
+
+            result = results[signal_type]
+
+            result["signals"] += len(signals)
+            result["errors"] += len(signals) - len(finished_at)
+            result["elapsed_s"] += max(finished_at.values(), default=st) - st
+            result["rpc_calls"] += len(calls)
+
+            for signal, (sent_at, latency_s, is_ok) in zip(signals, fired):
+                ticker = signal["ticker"].split(":")[1]
+
+                if not is_ok or ticker not in finished_at:
+                    continue
+
+                uid_calls = [(ts, method) for ts, method, uid in calls if uid == uids[ticker]]
+
+                result["http"].append(latency_s)
+                result["end_to_end"].append(finished_at[ticker] - sent_at)
+
+                if uid_calls:
+                    result["to_broker"].append(uid_calls[0][0] - sent_at)
+
+                post_order_calls = [ts for ts, method in uid_calls if method == "post_order"]
+
+                if post_order_calls:
+                    result["post_order"].append(post_order_calls[0] - sent_at)
+
+    for result in results.values():
+        result["signals_per_s"] = (result["signals"] - result["errors"]) / result["elapsed_s"] \
+            if result["elapsed_s"] > 0 else 0.0
+
+    return results
+
+
+def parse_latencies(values: list[str]) -> dict[str, float]:
+    latencies_s = {}
+
+    for value in values:
+        method, latency_ms = value.split("=")
+
+        latencies_s[method] = float(latency_ms) / 1000
+
+    return latencies_s
+
+
+def create_bot(workdir: str,
+               broker: fake_broker.FakeBroker,
+               tg_logger: logger.TgLogger,
+               webhook_queue: ring_buffer.RingBuffer,
+               webhook_metrics: metrics.Metrics,
+               account_name: str,
+               currency: str,
+               execution_engine: str) -> bot.Bot:
+    return bot.Bot([account_name],
+                   "",
+                   currency,
+                   cfg.max_verify_attempts,
+                   cfg.verify_delay_s,
+                   cfg.min_money_coefficient,
+                   os.path.join(workdir, "tickers.txt"),
+                   cfg.tickers_compact_interval_s,
+                   cfg.ticker_resolver_cache_size,
+                   cfg.log_step_perc,
+                   [],
+                   cfg.stats_hour,
+                   os.path.join(workdir, "margins"),
+                   cfg.margin_store_retention_s,
+                   cfg.client_pool_size,
+                   cfg.client_health_check_interval_s,
+                   cfg.client_keepalive_time_ms,
+                   os.path.join(workdir, "instruments.snapshot"),
+                   cfg.instruments_snapshot_max_age_s,
+                   execution_engine,
+                   cfg.max_in_flight_orders,
+                   cfg.trades_stream_reconnect_delay_s,
+                   cfg.positions_stream_reconnect_delay_s,
+                   cfg.positions_reconcile_interval_s,
+                   cfg.last_price_max_age_s,
+                   cfg.market_data_stream_reconnect_delay_s,
+                   cfg.margin_reconcile_interval_s,
+                   cfg.margin_reconcile_after_fills,
+                   cfg.margin_max_age_s,
+                   cfg.stop_orders_reconcile_interval_s,
+                   cfg.stop_orders_max_workers,
+                   cfg.dedup_ttl_s,
+                   cfg.dedup_hash_ttl_s,
+                   cfg.dedup_max_entries,
+                   cfg.dedup_id_field,
+                   cfg.batch_max_workers,
+                   tg_logger,
+                   webhook_queue,
+                   webhook_metrics,
+                   broker.client)
+
+
+def main_e2e(args):
+    price = Decimal(args.price)
+
+    instruments, prices = create_instruments(args.instruments, args.futures, cfg.currency, price)
+
+    broker = fake_broker.FakeBroker("benchmark",
+                                    instruments,
+                                    prices,
+                                    Decimal(args.liquid_portfolio),
+                                    parse_latencies(args.latency),
+                                    args.rpc_latency_ms / 1000,
+                                    args.fill_delay_ms / 1000)
+
+    webhook_queue = ring_buffer.RingBuffer(cfg.webhook_buffer_size)
+
+    tg_logger = _RecordingTgLogger()
+
+    webhook_metrics = metrics.Metrics()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        trading_bot = create_bot(workdir, broker, tg_logger, webhook_queue, webhook_metrics, "benchmark",
+                                 cfg.currency, args.execution_engine)
+
+        trading_bot.start()
+
+        wsm = server.WebhookServerManager(args.ip,
+                                          args.port,
+                                          (args.cert_path, args.key_path),
+                                          [],
+                                          [args.ip],
+                                          webhook_queue,
+                                          webhook_metrics,
+                                          server.IngressSettings(args.ingress_mode,
+                                                                 cfg.ingress_workers,
+                                                                 cfg.ingress_threads,
+                                                                 cfg.ingress_keepalive_s,
+                                                                 cfg.ingress_max_connections,
+                                                                 cfg.ingress_backlog,
+                                                                 cfg.ingress_drain_timeout_s),
+                                          cfg.liveness_check_interval_s,
+                                          cfg.heartbeat_timeout_s,
+                                          cfg.server_startup_timeout_s)
+
+        wsm.start()
+
+        try:
+            deadline = time.monotonic() + args.timeout_s
+
+            while trading_bot.instruments_count < len(instruments) and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+            results = run_e2e(f"https://{args.ip}:{args.port}/webhook",
+                              broker,
+                              tg_logger,
+                              instruments,
+                              price,
+                              args.rounds,
+                              args.concurrency,
+                              args.timeout_s,
+                              args.batch)
+        finally:
+            wsm.stop()
+
+            trading_bot.stop()
+
+            broker.close()
+
+    for signal_type, result in results.items():
+        print(f"{signal_type}: {result['signals_per_s']:.1f} signals/s, "
+              f"errors: {result['errors']}/{result['signals']}, rpc calls: {result['rpc_calls']}")
+
+        for stage in SIGNAL_STAGES:
+            print(f"  {format_latencies(stage, result[stage])}")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results, "metrics": webhook_metrics.render()}, f, indent=2)
+
+
+def main():
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    parser = argparse.ArgumentParser()
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingress_parser = subparsers.add_parser("ingress")
+    ingress_parser.add_argument("--url", default="https://127.0.0.1:443/ping")
+    ingress_parser.add_argument("--requests", type=int, default=5000)
+    ingress_parser.add_argument("--concurrency", type=int, default=64)
+    ingress_parser.add_argument("--payload", default=None)
+
+    e2e_parser = subparsers.add_parser("e2e")
+    e2e_parser.add_argument("--ip", default="127.0.0.1")
+    e2e_parser.add_argument("--port", type=int, default=8443)
+    e2e_parser.add_argument("--cert-path", default=cfg.cert_path)
+    e2e_parser.add_argument("--key-path", default=cfg.key_path)
+    e2e_parser.add_argument("--ingress-mode", default=cfg.ingress_mode)
+    e2e_parser.add_argument("--execution-engine", default=cfg.execution_engine)
+    e2e_parser.add_argument("--instruments", type=int, default=30)
+    e2e_parser.add_argument("--futures", type=int, default=5)
+    e2e_parser.add_argument("--rounds", type=int, default=5)
+    e2e_parser.add_argument("--concurrency", type=int, default=16)
+    e2e_parser.add_argument("--price", default="100")
+    e2e_parser.add_argument("--liquid-portfolio", default="1000000000")
+    e2e_parser.add_argument("--rpc-latency-ms", type=float, default=5)
+    e2e_parser.add_argument("--latency", action="append", default=[], metavar="METHOD=MS")
+    e2e_parser.add_argument("--fill-delay-ms", type=float, default=0)
+    e2e_parser.add_argument("--timeout-s", type=float, default=30)
+    e2e_parser.add_argument("--batch", action="store_true")
+    e2e_parser.add_argument("--output", default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "ingress":
+        payload = json.dumps(json.loads(args.payload)).encode() if args.payload is not None else None
+
+        result = run_ingress(args.url, args.requests, args.concurrency, payload)
+
+        print(f"{args.url}: {result['rps']:.1f} req/s, errors: {result['errors']}/{result['requests']}, "
+              f"elapsed: {result['elapsed_s']:.2f}s")
+        print(format_latencies("latency", result["latencies_s"]))
+    elif args.command == "e2e":
+        logging.basicConfig(level=logging.WARNING)
+
+        main_e2e(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,37 @@
 from tinkoff.invest import (OrderDirection, OrderType, StopOrderDirection, StopOrderType, StopOrderExpirationType,
-                            ExchangeOrderType, StopOrderStatusOption, OrderExecutionReportStatus, OrderState)
+                            ExchangeOrderType, OrderExecutionReportStatus, OrderState, PostOrderResponse)
 from tinkoff.invest.utils import decimal_to_quotation, money_to_decimal, quotation_to_decimal
-from tinkoff.invest import Client, Share, Future, Etf
-from xml.etree import ElementTree as ET
-from datetime import datetime as dt, timezone
-from collections import defaultdict
+from tinkoff.invest.exceptions import RequestError
+from tinkoff.invest import Share, Future, Etf, Client
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime as dt, timedelta, timezone
 from decimal import Decimal
+import pandas as pd
+import functools
 import threading
-import requests
 import logging
+import typing
 import queue
+import json
 import time
+import grpc
 import pytz
 
-import cfg
-import tinkoff_utils as tu
+import trading_account
+import price_cache
+import order_tracker
+import async_engine
+import deferred_scheduler
+import dedup_index
+import ticker_registry
+import ticker_resolver
+import ring_buffer
+import metrics
+import initial_margins
+import margin_store
+import instruments_snapshot
+import instrument_records
+import client_pool
 import logger
 import utils
 
@@ -59,6 +76,10 @@ class NotEnoughMoneyException(Exception):
     pass
 
 
+class StopOrderActionsException(Exception):
+    pass
+
+
 class WebhookType(utils.BaseEnum):
     OPEN = "open"
     RENEW_STOP_LOSS = "renew_stop_loss"
@@ -70,34 +91,76 @@ class PositionSide(utils.BaseEnum):
     SHORT = "SHORT"
 
 
+class ExecutionEngineType(utils.BaseEnum):
+    THREAD = "thread"
+    ASYNCIO = "asyncio"
+
+
 class Bot:
+    STATS_WINDOWS = {"1h": 3600, "24h": 86400, "7d": 604800}
+
     def __init__(self,
-                 account_name: str,
+                 account_names: list[str],
                  tinkoff_token: str,
                  currency: str,
                  max_verify_attempts: int,
                  verify_delay_s: float,
                  min_money_coefficient: float | str,
                  tickers_filename: str,
+                 tickers_compact_interval_s: float,
+                 ticker_resolver_cache_size: int,
                  log_step_perc: float,
                  windows_str: list[str],
                  stats_hour: int,
+                 margin_store_dirname: str,
+                 margin_store_retention_s: float,
+                 client_pool_size: int,
+                 client_health_check_interval_s: float,
+                 client_keepalive_time_ms: int,
+                 instruments_snapshot_filename: str,
+                 instruments_snapshot_max_age_s: float,
+                 execution_engine: str,
+                 max_in_flight_orders: int,
+                 trades_stream_reconnect_delay_s: float,
+                 positions_stream_reconnect_delay_s: float,
+                 positions_reconcile_interval_s: float,
+                 last_price_max_age_s: float,
+                 market_data_stream_reconnect_delay_s: float,
+                 margin_reconcile_interval_s: float,
+                 margin_reconcile_after_fills: int,
+                 margin_max_age_s: float,
+                 stop_orders_reconcile_interval_s: float,
+                 stop_orders_max_workers: int,
+                 dedup_ttl_s: float,
+                 dedup_hash_ttl_s: float,
+                 dedup_max_entries: int,
+                 dedup_id_field: str,
+                 batch_max_workers: int,
                  tg_logger: logger.TgLogger,
-                 webhook_queue: queue.Queue):
-        self._account_name = account_name
+                 webhook_queue: ring_buffer.RingBuffer,
+                 bot_metrics: metrics.Metrics,
+                 client_factory: typing.Callable = Client):
         self._tinkoff_token = tinkoff_token
         self._currency = currency
         self._max_verify_attempts = max_verify_attempts
         self._verify_delay_s = verify_delay_s
         self._min_money_coefficient = Decimal(min_money_coefficient)
-        self._tickers_filename = tickers_filename
         self._log_step_perc = log_step_perc
-        self._windows_str = windows_str
+        self._windows = utils.compile_time_windows(windows_str)
+        self._instruments_snapshot_filename = instruments_snapshot_filename
+        self._instruments_snapshot_max_age_s = instruments_snapshot_max_age_s
+        self._last_price_max_age_s = last_price_max_age_s
         self._stats_hour = stats_hour
         self._tg_logger = tg_logger
         self._webhook_queue = webhook_queue
+        self._metrics = bot_metrics
 
-        self._account_id = None
+        self._client_pool = client_pool.ClientPool(tinkoff_token,
+                                                   client_pool_size,
+                                                   client_health_check_interval_s,
+                                                   client_keepalive_time_ms,
+                                                   bot_metrics,
+                                                   client_factory)
 
         self._stop_event = threading.Event()
 
@@ -105,29 +168,85 @@ class Bot:
 
         self._initial_margins_retriever_thread = threading.Thread(target=self._initial_margins_retriever)
 
-        self._instruments: dict[str, dict[str, Future | Share | Etf]] = {}
-        self._instruments_by_uid: dict[str, Future | Share | Etf] = {}
+        self._instruments: dict[str, dict[str, instrument_records.InstrumentRecord]] = {}
+        self._instruments_by_uid: dict[str, instrument_records.InstrumentRecord] = {}
         self._instruments_lock = threading.Lock()
 
+        self._ticker_resolver = ticker_resolver.TickerResolver(currency, ticker_resolver_cache_size)
+
         self._webhook_handler_thread = threading.Thread(target=self._webhook_handler)
 
-        self._prev_initial_margins: dict | None = {}
-        self._prev_initial_margins_update_day: int | None = None
-        self._prev_initial_margins_alerts: dict[str, Decimal] = {}
+        self._deferred_scheduler = deferred_scheduler.DeferredScheduler(self._requeue_deferred)
+
+        self._dedup_index = dedup_index.DedupIndex(dedup_ttl_s, dedup_hash_ttl_s, dedup_max_entries,
+                                                   dedup_id_field)
+
+        self._execution_engine = \
+            async_engine.AsyncExecutionEngine(self._execute_webhook, max_in_flight_orders) \
+            if ExecutionEngineType.value_of(execution_engine) == ExecutionEngineType.ASYNCIO else None
+
+        self._ticker_registry = ticker_registry.TickerRegistry(tickers_filename, tickers_compact_interval_s)
+
+        self._accounts = [trading_account.TradingAccount(account_name,
+                                                         f"[{account_name}] " if len(account_names) > 1 else "",
+                                                         self._client_pool,
+                                                         trades_stream_reconnect_delay_s,
+                                                         positions_stream_reconnect_delay_s,
+                                                         positions_reconcile_interval_s,
+                                                         margin_reconcile_interval_s,
+                                                         margin_reconcile_after_fills,
+                                                         margin_max_age_s,
+                                                         stop_orders_reconcile_interval_s,
+                                                         tg_logger)
+                          for account_name in account_names]
+
+        self._accounts_executor = ThreadPoolExecutor(max_workers=len(account_names) * max_in_flight_orders,
+                                                     thread_name_prefix="accounts") \
+            if len(account_names) > 1 else None
+
+        self._price_cache = price_cache.LastPriceCache(self._client_pool,
+                                                       self._tracked_instrument_uids,
+                                                       60,
+                                                       market_data_stream_reconnect_delay_s)
+
+        self._stop_orders_executor = ThreadPoolExecutor(max_workers=stop_orders_max_workers,
+                                                        thread_name_prefix="stop_orders")
+
+        self._batch_executor = ThreadPoolExecutor(max_workers=batch_max_workers, thread_name_prefix="batch")
+
+        self._initial_margins_fetcher = initial_margins.InitialMarginsFetcher(10)
+
+        self._margin_store = margin_store.MarginStore(margin_store_dirname, margin_store_retention_s)
+
+        self._prev_initial_margins_alerts = pd.Series(dtype="float64")
+
+    @property
+    def instruments_count(self) -> int:
+        return len(self._instruments_by_uid)
 
     def start(self):
-        with Client(self._tinkoff_token) as client:
-            account_id = tu.get_account_id(client, self._account_name)
+        self._client_pool.start()
+
+        for account in self._accounts:
+            account.start()
 
-        if account_id is None:
-            raise tu.AccountNotFoundException(f"Account '{self._account_name}' not found!")
+        self._ticker_registry.start()
 
-        self._account_id = account_id
+        self._load_instruments_snapshot()
 
         self._instruments_updater_thread.start()
 
+        self._price_cache.start()
+
+        self._margin_store.load()
+
         self._initial_margins_retriever_thread.start()
 
+        if self._execution_engine is not None:
+            self._execution_engine.start()
+
+        self._deferred_scheduler.start()
+
         self._webhook_handler_thread.start()
 
     def stop(self):
@@ -140,6 +259,13 @@ class Bot:
 
         logging.info("Webhook handler stopped.")
 
+        self._deferred_scheduler.stop()
+
+        logging.info("Deferred scheduler stopped.")
+
+        if self._execution_engine is not None:
+            self._execution_engine.stop()
+
         if self._instruments_updater_thread.is_alive():
             self._instruments_updater_thread.join()
 
@@ -148,21 +274,41 @@ class Bot:
         if self._initial_margins_retriever_thread.is_alive():
             self._initial_margins_retriever_thread.join()
 
+        self._initial_margins_fetcher.close()
+
         logging.info("Initial margins retriever stopped.")
 
+        if self._accounts_executor is not None:
+            self._accounts_executor.shutdown(wait=True)
+
+        self._batch_executor.shutdown(wait=True)
+
+        for account in self._accounts:
+            account.stop()
+
+        self._price_cache.stop()
+
+        logging.info("Last price cache stopped.")
+
+        self._stop_orders_executor.shutdown(wait=True)
+
+        self._ticker_registry.stop()
+
+        logging.info("Ticker registry stopped.")
+
+        self._client_pool.close()
+
     def _instruments_updater(self):
         while not self._stop_event.is_set():
             try:
-                with Client(self._tinkoff_token) as client:
-                    instruments = defaultdict(dict)
-
-                    instruments_by_uid = {}
+                with self._client_pool.client() as client:
+                    items_by_uid = {}
 
                     for method in ["futures", "shares", "etfs"]:
                         for item in getattr(client.instruments, method)().instruments:
-                            instruments[item.ticker][item.currency] = item
+                            items_by_uid[item.uid] = item
 
-                            instruments_by_uid[item.uid] = item
+                instruments, instruments_by_uid = instrument_records.build_catalogue(items_by_uid.values())
             except Exception as ex:
                 self._tg_logger.send_tg(f"❌ Error occurred during instrument list update: {ex.__class__.__name__} {ex}")
 
@@ -170,80 +316,298 @@ class Bot:
 
                 continue
 
+            self._ticker_resolver.rebuild(instruments_by_uid)
+
             with self._instruments_lock:
                 self._instruments = instruments
                 self._instruments_by_uid = instruments_by_uid
 
+            try:
+                instruments_snapshot.save(self._instruments_snapshot_filename, items_by_uid)
+            except Exception as ex:
+                logging.error(f"Error saving instruments snapshot: {ex.__class__.__name__} {ex}")
+
             time.sleep(60)
 
+    def _tracked_instrument_uids(self) -> set[str]:
+        tickers = self._ticker_registry.tickers
+
+        with self._instruments_lock:
+            return {self._instruments[ticker][self._currency].uid for ticker in tickers
+                    if self._currency in self._instruments.get(ticker, {})}
+
+    def _load_instruments_snapshot(self):
+        st = time.time()
+
+        snapshot = instruments_snapshot.load(self._instruments_snapshot_filename,
+                                             self._instruments_snapshot_max_age_s)
+
+        if snapshot is None:
+            logging.info("Instruments snapshot not loaded, waiting for instruments updater.")
+
+            return
+
+        items_by_uid, created_at = snapshot
+
+        instruments, instruments_by_uid = instrument_records.build_catalogue(items_by_uid.values())
+
+        with self._instruments_lock:
+            if not self._instruments_by_uid:
+                self._ticker_resolver.rebuild(instruments_by_uid)
+
+                self._instruments = instruments
+                self._instruments_by_uid = instruments_by_uid
+
+        logging.info(f"Instruments snapshot loaded in {(time.time() - st) * 1000:.1f}ms: "
+                     f"{len(instruments_by_uid)} instruments, age {time.time() - created_at:.0f}s.")
+
     def _webhook_handler(self):
         while not self._stop_event.is_set():
             try:
-                data = self._webhook_queue.get(timeout=1)
+                raw_data, enqueued_at = self._webhook_queue.get_entry(timeout=1)
 
-                current_time = dt.now(pytz.utc)
+                self._metrics.stage_seconds.observe("queue", time.monotonic() - enqueued_at)
+
+                try:
+                    data = json.loads(raw_data)
+                except ValueError as ex:
+                    self._metrics.signals.inc("decode_error")
+
+                    self._tg_logger.send_tg(f"❌ Error occurred while decoding webhook: "
+                                            f"{ex.__class__.__name__} {ex}.\n"
+                                            f"Webhook: {raw_data}.")
+
+                    continue
+
+                if self._dedup_index.check_and_add(self._dedup_index.get_key(data, raw_data)):
+                    self._metrics.signals.inc("duplicate")
 
-                within_window, window_end = utils.is_within_time_window(current_time,
-                                                                        utils.get_utc_time_windows(self._windows_str))
+                    self._tg_logger.send_tg(f"⚠️ Duplicate webhook dropped "
+                                            f"({self._dedup_index.duplicates} so far): {data}")
 
-                if not within_window:
-                    msg = self._on_webhook(data)
+                    continue
 
-                    self._tg_logger.send_tg(msg)
+                self._metrics.gauges.set("dedup_entries", self._dedup_index.size)
+
+                current_time = dt.now(pytz.utc)
+
+                window_end = utils.get_time_window_end(current_time, self._windows)
+
+                if window_end is None:
+                    self._dispatch(data)
                 else:
-                    time_to_wait = (window_end - current_time).total_seconds()
+                    self._deferred_scheduler.schedule(window_end, raw_data)
 
-                    threading.Thread(target=self._handle_delayed_message, args=(data, time_to_wait)).start()
+                    self._metrics.signals.inc("deferred")
+                    self._metrics.gauges.set("deferred_pending", self._deferred_scheduler.pending_count)
+
+                    logging.info(f"Deferred till {window_end}: {data}, "
+                                 f"pending: {self._deferred_scheduler.pending_count}")
             except queue.Empty:
                 continue
             except Exception as ex:
                 self._tg_logger.send_tg(f"❌ Error occurred: {ex.__class__.__name__} {ex}")
 
-    def _handle_delayed_message(self, data, time_to_wait):
-        logging.info(f"Waiting {time_to_wait} for {data}")
+    def _requeue_deferred(self, raw_data: bytes):
+        self._dedup_index.discard(self._dedup_index.get_key(json.loads(raw_data), raw_data))
 
-        if time_to_wait > 0:
-            time.sleep(time_to_wait)
+        self._metrics.gauges.set("deferred_pending", self._deferred_scheduler.pending_count)
 
-        self._webhook_queue.put(data)
+        if not self._webhook_queue.put(raw_data):
+            self._tg_logger.send_tg(f"❌ Webhook queue is full, deferred webhook dropped: {raw_data}")
 
-    def _on_webhook(self, webhook_json: dict) -> str:
-        webhook_type = WebhookType.value_of(webhook_json["type"])
+    def _dispatch(self, data: dict | list):
+        if self._execution_engine is None:
+            self._execute_webhook(data)
+        else:
+            if isinstance(data, list):
+                self._execution_engine.submit_many([self._ticker_resolver.resolve(str(signal.get("ticker", "")))[0]
+                                                    for signal in data if isinstance(signal, dict)] or [""], data)
+            else:
+                self._execution_engine.submit(self._ticker_resolver.resolve(str(data.get("ticker", "")))[0], data)
 
-        ticker = str(webhook_json["ticker"])
+            self._metrics.gauges.set("execution_lanes", self._execution_engine.lanes_count)
 
-        split_ticker = ticker.split(":")
+    def _execute_webhook(self, data: dict | list):
+        started_at = time.perf_counter()
 
-        if len(split_ticker) > 1:
-            ticker = split_ticker[1]
+        execute = self._execute_batch_for_account if isinstance(data, list) else self._execute_for_account
 
-        ticker = utils.reduce_year_from_string(ticker)
+        if self._accounts_executor is None:
+            execute(self._accounts[0], data, started_at)
+        else:
+            futures = [self._accounts_executor.submit(execute, account, data, started_at)
+                       for account in self._accounts]
 
-        utils.add_to_set(self._tickers_filename, ticker)
+            for future in futures:
+                future.result()
 
-        position_side = PositionSide.value_of(webhook_json["position_side"])
+        self._metrics.gauges.set("tg_backlog", self._tg_logger.backlog)
 
-        with self._instruments_lock:
-            if ticker not in self._instruments or self._currency not in self._instruments[ticker]:
-                raise InstrumentNotFoundException(f"Instrument '{ticker}' '{self._currency}' not found!")
+    def _execute_for_account(self,
+                             account: trading_account.TradingAccount,
+                             data: dict,
+                             started_at: float,
+                             balances: dict[str, int] | None = None) -> bool:
+        stages = self._metrics.stage_timer(started_at)
+
+        is_ok = False
+
+        try:
+            msg = self._on_webhook(account, data, stages, balances)
+
+            self._metrics.signals.inc("ok")
+
+            self._tg_logger.send_tg(f"{account.tag}{msg}")
+
+            is_ok = True
+        except Exception as ex:
+            self._metrics.signals.inc("error")
+
+            self._tg_logger.send_tg(f"{account.tag}❌ Error occurred: {ex.__class__.__name__} {ex}")
+
+        stages.finish()
+
+        return is_ok
+
+    def _execute_batch_for_account(self,
+                                   account: trading_account.TradingAccount,
+                                   signals: list[dict],
+                                   started_at: float):
+        stages = self._metrics.stage_timer(started_at)
+
+        try:
+            balances = self._prefetch_batch(account, signals)
+        except Exception as ex:
+            balances = {}
+
+            logging.warning(f"{account.tag}Error prefetching batch of {len(signals)} signals: "
+                            f"{ex.__class__.__name__} {ex}")
+
+        stages.mark("batch_prefetch")
+
+        groups: dict[str, list[dict]] = {}
+
+        for signal in signals:
+            ticker = self._ticker_resolver.resolve(str(signal.get("ticker", "")))[0] \
+                if isinstance(signal, dict) else ""
+
+            groups.setdefault(ticker, []).append(signal)
+
+        futures = [self._batch_executor.submit(self._execute_batch_group, account, group, started_at, balances)
+                   for group in groups.values()]
+
+        ok_count = sum(future.result() for future in futures)
+
+        self._tg_logger.send_tg(f"{account.tag}📦 Batch of {len(signals)} signals executed in "
+                                f"{(time.perf_counter() - started_at) * 1000:.0f}ms: "
+                                f"{ok_count} ok, {len(signals) - ok_count} failed.")
+
+    def _execute_batch_group(self,
+                             account: trading_account.TradingAccount,
+                             group: list[dict],
+                             started_at: float,
+                             balances: dict[str, int]) -> int:
+        ok_count = 0
+
+        for i, signal in enumerate(group):
+            if not isinstance(signal, dict):
+                self._metrics.signals.inc("error")
+
+                self._tg_logger.send_tg(f"{account.tag}❌ Error occurred: invalid batch signal {signal}")
+
+                continue
+
+            # Later signals of the same instrument must see the fills of the earlier ones, not the prefetched balance.
+            ok_count += self._execute_for_account(account, signal, started_at, balances if i == 0 else None)
+
+        return ok_count
+
+    def _prefetch_batch(self, account: trading_account.TradingAccount, signals: list[dict]) -> dict[str, int]:
+        instruments: dict[str, instrument_records.InstrumentRecord] = {}
+        open_uids = set()
+        has_stop_order_actions = False
+
+        for signal in signals:
+            if not isinstance(signal, dict):
+                continue
+
+            _, instrument = self._ticker_resolver.resolve(str(signal.get("ticker", "")))
+
+            if instrument is None or instrument.kind is None:
+                continue
+
+            instruments[instrument.uid] = instrument
+
+            if signal.get("type") == WebhookType.OPEN.value:
+                open_uids.add(instrument.uid)
+            else:
+                has_stop_order_actions = True
+
+        balances = {}
+
+        with self._client_pool.client() as client:
+            if any(account.position_book.get_balance(uid) is None for uid in instruments):
+                positions = client.operations.get_positions(account_id=account.id)
+
+                found = {position.instrument_uid: position.balance
+                         for position in list(positions.securities) + list(positions.futures)}
 
-            instrument = self._instruments[ticker][self._currency]
+                balances = {uid: found.get(uid, 0) for uid in instruments}
 
-        if instrument.__class__.__name__ not in [Future.__name__, Share.__name__, Etf.__name__]:
+            missing_price_uids = [uid for uid in open_uids
+                                  if self._price_cache.get(uid, self._last_price_max_age_s) is None]
+
+            if missing_price_uids:
+                response = client.market_data.get_last_prices(instrument_id=missing_price_uids)
+
+                for last_price in response.last_prices:
+                    self._price_cache.put(last_price.instrument_uid, quotation_to_decimal(last_price.price))
+
+            if open_uids and not account.margin_engine.is_fresh:
+                response = client.users.get_margin_attributes(account_id=account.id)
+
+                account.margin_engine.update(money_to_decimal(response.starting_margin),
+                                             money_to_decimal(response.liquid_portfolio))
+
+            if has_stop_order_actions and not account.stop_order_index.is_synced:
+                account.stop_order_index.refresh(client)
+
+        return balances
+
+    def _on_webhook(self,
+                    account: trading_account.TradingAccount,
+                    webhook_json: dict,
+                    stages: metrics.StageTimer,
+                    balances: dict[str, int] | None = None) -> str:
+        webhook_type = WebhookType.value_of(webhook_json["type"])
+
+        ticker, instrument = self._ticker_resolver.resolve(str(webhook_json["ticker"]))
+
+        self._ticker_registry.add(ticker)
+
+        position_side = PositionSide.value_of(webhook_json["position_side"])
+
+        if instrument is None:
+            raise InstrumentNotFoundException(f"Instrument '{ticker}' '{self._currency}' not found!")
+
+        if instrument.kind is None:
             raise UnsupportedTypeException(
-                f"Unsupported type exception: {instrument.__class__.__name__},"
+                f"Unsupported type exception: {instrument.ticker},"
                 f"supported {Share.__name__}, {Future.__name__} and {Etf.__name__}!")
 
-        if instrument.__class__.__name__ != Future.__name__ and position_side != PositionSide.LONG:
+        if instrument.kind != instrument_records.InstrumentKind.FUTURE and position_side != PositionSide.LONG:
             raise UnsupportedPositionSideException(
-                f"Unsupported position side for {instrument.__class__.__name__} '{ticker}' '{self._currency}': "
+                f"Unsupported position side for {instrument.kind.value} '{ticker}' '{self._currency}': "
                 f"{position_side.value}!")
 
-        tick_size = quotation_to_decimal(instrument.min_price_increment)
+        tick_size = instrument.tick_size
 
-        tp_price = utils.round_price(Decimal(webhook_json["tp_price"]) * instrument.lot, tick_size) \
+        stages.mark("resolve")
+
+        tp_price = instrument.round_price(Decimal(webhook_json["tp_price"]) * instrument.lot) \
             if "tp_price" in webhook_json else None
-        sl_price = utils.round_price(Decimal(webhook_json["sl_price"]) * instrument.lot, tick_size) \
+        sl_price = instrument.round_price(Decimal(webhook_json["sl_price"]) * instrument.lot) \
             if "sl_price" in webhook_json else None
 
         if webhook_type == WebhookType.OPEN:
@@ -252,9 +616,8 @@ class Bot:
             # if qty % instrument.lot != 0:
             #     qty = int(qty / instrument.lot) * instrument.lot
 
-            if instrument.__class__.__name__ == Future.__name__:
-                qty = int(qty / instrument.lot / float(quotation_to_decimal(instrument.min_price_increment_amount)) *
-                          float(tick_size))
+            if instrument.kind == instrument_records.InstrumentKind.FUTURE:
+                qty = int(Decimal(qty) / instrument.lot / instrument.point_value)
             else:
                 qty = int(qty / instrument.lot)
 
@@ -262,8 +625,10 @@ class Bot:
                 raise IllegalQtyException(f"Invalid quantity for '{ticker}' '{self._currency}': {qty}, "
                                           f"lot: {instrument.lot}!")
 
-            with Client(self._tinkoff_token) as client:
-                current_balance = self._get_balance(client, instrument)
+            with self._client_pool.client() as client:
+                current_balance = self._get_balance(account, client, instrument, balances)
+
+                stages.mark("balance")
 
                 if current_balance is None:
                     raise BalanceNotFoundException(f"Balance for '{ticker}' '{self._currency}' not found!")
@@ -272,18 +637,23 @@ class Bot:
                     raise BalanceNonZeroException(
                         f"Balance for '{ticker}' '{self._currency}' non zero: {current_balance}!")
 
-                if instrument.__class__.__name__ == Future.__name__:
-                    last_price = quotation_to_decimal(client.market_data.get_last_prices(
-                        instrument_id=[instrument.uid]).last_prices[0].price) / \
-                                 quotation_to_decimal(instrument.min_price_increment) * \
-                                 quotation_to_decimal(instrument.min_price_increment_amount)
+                price = self._price_cache.get(instrument.uid, self._last_price_max_age_s)
+
+                if price is None:
+                    price = quotation_to_decimal(client.market_data.get_last_prices(
+                        instrument_id=[instrument.uid]).last_prices[0].price)
+
+                    self._price_cache.put(instrument.uid, price)
+
+                stages.mark("price")
+
+                if instrument.kind == instrument_records.InstrumentKind.FUTURE:
+                    last_price = price * instrument.point_value
                 else:
-                    last_price = quotation_to_decimal(client.market_data.get_last_prices(
-                        instrument_id=[instrument.uid]).last_prices[0].price) * instrument.lot
+                    last_price = price * instrument.lot
 
                 start_margin = \
-                    (quotation_to_decimal(instrument.dlong) if position_side == PositionSide.LONG else
-                     quotation_to_decimal(instrument.dshort)) * last_price * qty
+                    (instrument.dlong if position_side == PositionSide.LONG else instrument.dshort) * last_price * qty
 
                 # response = client.instruments.get_futures_margin(figi=instrument.figi)
                 #
@@ -291,15 +661,23 @@ class Bot:
                 #     money_to_decimal(response.initial_margin_on_buy if position_side == PositionSide.LONG else
                 #                      response.initial_margin_on_sell) * qty
 
-                response = client.users.get_margin_attributes(account_id=self._account_id)
+                margin = account.margin_engine.reserve(start_margin, self._min_money_coefficient)
+
+                if margin is None:
+                    response = client.users.get_margin_attributes(account_id=account.id)
 
-                account_start_margin = money_to_decimal(response.starting_margin)
+                    account.margin_engine.update(money_to_decimal(response.starting_margin),
+                                               money_to_decimal(response.liquid_portfolio))
 
-                liquid_portfolio = money_to_decimal(response.liquid_portfolio)
+                    margin = account.margin_engine.reserve(start_margin, self._min_money_coefficient)
+
+                account_start_margin, liquid_portfolio, is_reserved = margin
 
                 new_account_start_margin = account_start_margin + start_margin
 
-                if account_start_margin + start_margin > liquid_portfolio * self._min_money_coefficient:
+                stages.mark("margin")
+
+                if not is_reserved:
                     raise NotEnoughMoneyException(
                         f"'{ticker}' '{self._currency}' not enough money to open position.\n"
                         f"Account start margin: {account_start_margin:.2f}.\n"
@@ -308,31 +686,67 @@ class Bot:
                         f"Potential new account start margin: ~{new_account_start_margin:.2f}/"
                         f"{liquid_portfolio * self._min_money_coefficient:.2f}.\n")
 
-                response = client.orders.post_order(
-                    instrument_id=instrument.uid,
-                    quantity=qty,
-                    account_id=self._account_id,
-                    direction=OrderDirection.ORDER_DIRECTION_BUY if position_side == PositionSide.LONG
-                    else OrderDirection.ORDER_DIRECTION_SELL,
-                    order_type=OrderType.ORDER_TYPE_MARKET
-                )
-
-                order_state = self._wait_till_status(client,
-                                                     response.order_id,
-                                                     OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL,
-                                                     [OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_CANCELLED,
-                                                      OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_REJECTED])
+                is_order_sent = False
+
+                try:
+                    account.position_book.mark_dirty(instrument.uid)
+
+                    margin_generation = account.margin_engine.generation
+
+                    is_order_sent = True
+
+                    response = client.orders.post_order(
+                        instrument_id=instrument.uid,
+                        quantity=qty,
+                        account_id=account.id,
+                        direction=OrderDirection.ORDER_DIRECTION_BUY if position_side == PositionSide.LONG
+                        else OrderDirection.ORDER_DIRECTION_SELL,
+                        order_type=OrderType.ORDER_TYPE_MARKET
+                    )
+
+                    stages.mark("post_order")
+
+                    order_state = self._wait_till_status(account,
+                                                         client,
+                                                         response,
+                                                         OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL,
+                                                         [OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_CANCELLED,
+                                                          OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_REJECTED])
+
+                    stages.mark("wait_status")
+                except Exception:
+                    account.margin_engine.release(start_margin)
+
+                    if is_order_sent:
+                        account.margin_engine.request_reconcile()
+
+                    raise
+
+                account.margin_engine.commit(start_margin, margin_generation)
+
+                stop_order_actions = {}
 
                 if tp_price:
-                    self._place_tp(client, qty, instrument.uid, tp_price, position_side)
+                    stop_order_actions["tp"] = \
+                        functools.partial(self._place_tp, account, client, qty, instrument.uid, tp_price,
+                                          position_side)
 
                 if sl_price:
-                    self._place_sl(client, qty, instrument.uid, sl_price, position_side)
+                    stop_order_actions["sl"] = \
+                        functools.partial(self._place_sl, account, client, qty, instrument.uid, sl_price,
+                                          position_side)
+
+                stop_order_errors = self._run_stop_order_actions(stop_order_actions)
 
-                if instrument.__class__.__name__ == Future.__name__:
+                stages.mark("stop_orders")
+
+                stop_order_warnings = "".join(f"⚠️ {k} not placed: {v.__class__.__name__} {v}\n"
+                                              for k, v in stop_order_errors.items())
+
+                if instrument.kind == instrument_records.InstrumentKind.FUTURE:
                     executed_price = \
-                        (money_to_decimal(order_state.executed_order_price) * tick_size) / \
-                        (order_state.lots_executed * quotation_to_decimal(instrument.min_price_increment_amount))
+                        money_to_decimal(order_state.executed_order_price) / \
+                        (order_state.lots_executed * instrument.point_value)
 
                     executed_price = Decimal(int(executed_price / tick_size) * tick_size)
                 else:
@@ -342,10 +756,13 @@ class Bot:
                        f"position opened on price " \
                        f"{executed_price} | lots: {order_state.lots_executed} | tp: {tp_price} | sl: {sl_price} | "\
                        f"margin: {start_margin:.2f} | account start margin: ~{new_account_start_margin:.2f}\n"\
+                       f"{stop_order_warnings}"\
                        f"{webhook_json.get('comment', '')}"
         elif webhook_type == WebhookType.RENEW_STOP_LOSS:
-            with Client(self._tinkoff_token) as client:
-                current_balance = int(self._get_balance(client, instrument))
+            with self._client_pool.client() as client:
+                current_balance = int(self._get_balance(account, client, instrument, balances))
+
+                stages.mark("balance")
 
                 if current_balance is None:
                     raise BalanceNotFoundException(f"Balance for '{ticker}' '{self._currency}' not found!")
@@ -354,37 +771,26 @@ class Bot:
                     raise NothingToRenewStopLossException(
                         f"Canʼt renew stop loss, balance for '{ticker}' '{self._currency}': {current_balance}!")
 
-                response = client.stop_orders.get_stop_orders(account_id=self._account_id,
-                                                              status=StopOrderStatusOption.STOP_ORDER_STATUS_ACTIVE)
+                self._cancel_stop_orders(account, client, instrument.uid, StopOrderType.STOP_ORDER_TYPE_STOP_LOSS)
 
-                stop_loss_order_ids = \
-                    [stop_order.stop_order_id for stop_order in response.stop_orders if
-                     stop_order.order_type == StopOrderType.STOP_ORDER_TYPE_STOP_LOSS and
-                     stop_order.instrument_uid == instrument.uid]
+                stages.mark("cancel_stop_orders")
 
-                for stop_loss_order_id in stop_loss_order_ids:
-                    client.stop_orders.cancel_stop_order(account_id=self._account_id,
-                                                         stop_order_id=stop_loss_order_id)
+                self._place_sl(account, client, abs(current_balance), instrument.uid, sl_price, position_side)
 
-                self._place_sl(client, abs(current_balance), instrument.uid, sl_price, position_side)
+                stages.mark("stop_orders")
 
             return f"✅ '{ticker}' {instrument.name} '{self._currency}' {position_side.value} "\
                    f"sl price changed to {sl_price} \n"\
                     f"{webhook_json.get('comment', '')}"
         elif webhook_type == WebhookType.CLOSE:
-            with Client(self._tinkoff_token) as client:
-                response = client.stop_orders.get_stop_orders(account_id=self._account_id,
-                                                              status=StopOrderStatusOption.STOP_ORDER_STATUS_ACTIVE)
+            with self._client_pool.client() as client:
+                self._cancel_stop_orders(account, client, instrument.uid)
 
-                stop_order_ids = \
-                    [stop_order.stop_order_id for stop_order in response.stop_orders if
-                     stop_order.instrument_uid == instrument.uid]
+                stages.mark("cancel_stop_orders")
 
-                for stop_order_id in stop_order_ids:
-                    client.stop_orders.cancel_stop_order(account_id=self._account_id,
-                                                         stop_order_id=stop_order_id)
+                current_balance = self._get_balance(account, client, instrument, balances)
 
-                current_balance = self._get_balance(client, instrument)
+                stages.mark("balance")
 
                 if current_balance is None:
                     raise BalanceNotFoundException(f"Balance for '{ticker}' '{self._currency}' not found!")
@@ -393,26 +799,40 @@ class Bot:
                     raise NothingToCloseException(
                         f"Nothing to close for '{ticker}' '{self._currency}', balance: {current_balance}!")
 
-                response = client.orders.post_order(
-                    instrument_id=instrument.uid,
-                    quantity=abs(current_balance),
-                    account_id=self._account_id,
-                    direction=OrderDirection.ORDER_DIRECTION_SELL if position_side == PositionSide.LONG
-                    else OrderDirection.ORDER_DIRECTION_BUY,
-                    order_type=OrderType.ORDER_TYPE_MARKET
-                )
-
-                order_state = self._wait_till_status(
-                    client,
-                    response.order_id,
-                    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL,
-                    [OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_CANCELLED,
-                     OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_REJECTED])
-
-                if instrument.__class__.__name__ == Future.__name__:
+                account.position_book.mark_dirty(instrument.uid)
+
+                try:
+                    response = client.orders.post_order(
+                        instrument_id=instrument.uid,
+                        quantity=abs(current_balance),
+                        account_id=account.id,
+                        direction=OrderDirection.ORDER_DIRECTION_SELL if position_side == PositionSide.LONG
+                        else OrderDirection.ORDER_DIRECTION_BUY,
+                        order_type=OrderType.ORDER_TYPE_MARKET
+                    )
+
+                    stages.mark("post_order")
+
+                    order_state = self._wait_till_status(
+                        account,
+                        client,
+                        response,
+                        OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL,
+                        [OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_CANCELLED,
+                         OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_REJECTED])
+
+                    stages.mark("wait_status")
+                except Exception:
+                    account.margin_engine.request_reconcile()
+
+                    raise
+
+                account.margin_engine.on_position_closed()
+
+                if instrument.kind == instrument_records.InstrumentKind.FUTURE:
                     executed_price = \
-                        (money_to_decimal(order_state.executed_order_price) * tick_size) / \
-                        (order_state.lots_executed * quotation_to_decimal(instrument.min_price_increment_amount))
+                        money_to_decimal(order_state.executed_order_price) / \
+                        (order_state.lots_executed * instrument.point_value)
 
                     executed_price = Decimal(int(executed_price / tick_size) * tick_size)
                 else:
@@ -424,16 +844,93 @@ class Bot:
                        f"{webhook_json.get('comment', '')}"
 
     def _wait_till_status(self,
+                          account: trading_account.TradingAccount,
+                          client,
+                          response: PostOrderResponse,
+                          required_order_status: OrderExecutionReportStatus,
+                          break_order_status: list[OrderExecutionReportStatus]) -> OrderState:
+        if response.execution_report_status in break_order_status:
+            raise IllegalOrderStatusException(
+                f"Illegal order status with id: {response.order_id}, {response.execution_report_status.value}!")
+
+        # PostOrderResponse prices are per instrument, so even an immediate fill is reported from the order state.
+        if response.execution_report_status != required_order_status and account.order_tracker.is_streaming:
+            order_state = self._wait_till_status_streaming(account,
+                                                           client,
+                                                           response.order_id,
+                                                           required_order_status,
+                                                           break_order_status)
+
+            if order_state is not None:
+                return order_state
+
+            logging.warning(f"Order {response.order_id} not confirmed by trades stream, falling back to polling.")
+
+        return self._poll_till_status(account,
+                                      client,
+                                      response.order_id,
+                                      required_order_status,
+                                      break_order_status)
+
+    def _wait_till_status_streaming(self,
+                                    account: trading_account.TradingAccount,
+                                    client,
+                                    order_id: str,
+                                    required_order_status: OrderExecutionReportStatus,
+                                    break_order_status: list[OrderExecutionReportStatus]) -> OrderState | None:
+        deadline = time.monotonic() + self._max_verify_attempts * self._verify_delay_s
+
+        future = account.order_tracker.register(order_id)
+
+        is_polled = False
+
+        try:
+            while True:
+                timeout_s = deadline - time.monotonic() if is_polled else self._verify_delay_s
+
+                try:
+                    future.result(timeout=max(timeout_s, 0))
+                except order_tracker.OrderStreamDownException:
+                    return None
+                except FutureTimeoutError:
+                    # Cancels and rejects produce no trades, so the order state is checked once without an event.
+                    if is_polled:
+                        return None
+
+                    is_polled = True
+                else:
+                    future = account.order_tracker.register(order_id)
+
+                try:
+                    response = client.orders.get_order_state(account_id=account.id, order_id=order_id)
+                except (RequestError, grpc.RpcError) as ex:
+                    logging.warning(f"Error getting order state with id: {order_id}: {ex.__class__.__name__} {ex}")
+
+                    return None
+
+                if response.execution_report_status in break_order_status:
+                    raise IllegalOrderStatusException(
+                        f"Illegal order status with id: {order_id}, {response.execution_report_status.value}!")
+
+                if response.execution_report_status == required_order_status:
+                    return response
+        finally:
+            account.order_tracker.discard(order_id)
+
+    def _poll_till_status(self,
+                          account: trading_account.TradingAccount,
                           client,
                           order_id: str,
                           required_order_status: OrderExecutionReportStatus,
                           break_order_status: list[OrderExecutionReportStatus]) -> OrderState:
-        for i in range(self._max_verify_attempts):
-            order_status = None
+        order_status = None
 
+        for i in range(self._max_verify_attempts):
             try:
-                response = client.orders.get_order_state(account_id=self._account_id, order_id=order_id)
-
+                response = client.orders.get_order_state(account_id=account.id, order_id=order_id)
+            except Exception as ex:
+                logging.warning(f"Error getting order state with id: {order_id}: {ex.__class__.__name__} {ex}")
+            else:
                 order_status = response.execution_report_status
 
                 if order_status in break_order_status:
@@ -442,23 +939,35 @@ class Bot:
 
                 if order_status == required_order_status:
                     return response
-            except Exception:
-                pass
 
-            if i == self._max_verify_attempts - 1:
-                raise IllegalOrderStatusException(f"Illegal order status with id: {order_id}, {order_status.value}!")
+            if i < self._max_verify_attempts - 1:
+                time.sleep(self._verify_delay_s)
+
+        raise IllegalOrderStatusException(
+            f"Illegal order status with id: {order_id}, {order_status.value if order_status else None}!")
 
-            time.sleep(self._verify_delay_s)
+    def _get_balance(self,
+                     account: trading_account.TradingAccount,
+                     client,
+                     instrument: instrument_records.InstrumentRecord,
+                     balances: dict[str, int] | None = None) -> int | None:
+        if instrument.kind is None:
+            return None
+
+        current_balance = account.position_book.get_balance(instrument.uid)
+
+        if current_balance is not None:
+            return current_balance
+
+        if balances is not None and instrument.uid in balances:
+            return balances[instrument.uid]
 
-    def _get_balance(self, client, instrument) -> int | None:
-        positions = client.operations.get_positions(account_id=self._account_id)
+        positions = client.operations.get_positions(account_id=account.id)
 
-        if instrument.__class__.__name__ in [Share.__name__, Etf.__name__]:
+        if instrument.kind in [instrument_records.InstrumentKind.SHARE, instrument_records.InstrumentKind.ETF]:
             positions = positions.securities
-        elif instrument.__class__.__name__ == Future.__name__:
-            positions = positions.futures
         else:
-            return None
+            positions = positions.futures
 
         current_balance = 0
 
@@ -470,114 +979,189 @@ class Bot:
 
         return current_balance
 
-    def _place_tp(self, client, qty: int, uid: str, price: Decimal, position_side: PositionSide):
-        return client.stop_orders.post_stop_order(
+    def _get_stop_order_ids(self,
+                            account: trading_account.TradingAccount,
+                            client,
+                            uid: str,
+                            stop_order_type: StopOrderType | None = None) -> list[str]:
+        stop_order_ids = account.stop_order_index.get(uid, stop_order_type)
+
+        if stop_order_ids is None:
+            account.stop_order_index.refresh(client)
+
+            stop_order_ids = account.stop_order_index.get(uid, stop_order_type)
+
+        return stop_order_ids
+
+    def _cancel_stop_orders(self,
+                            account: trading_account.TradingAccount,
+                            client,
+                            uid: str,
+                            stop_order_type: StopOrderType | None = None):
+        stop_order_errors = self._run_stop_order_actions(
+            {stop_order_id: functools.partial(self._cancel_stop_order, account, client, uid, stop_order_id)
+             for stop_order_id in self._get_stop_order_ids(account, client, uid, stop_order_type)})
+
+        if not stop_order_errors:
+            return
+
+        logging.warning(f"Error cancelling {len(stop_order_errors)} stop order(s) for {uid}, "
+                        f"refreshing stop order index.")
+
+        account.stop_order_index.refresh(client)
+
+        stop_order_errors = self._run_stop_order_actions(
+            {stop_order_id: functools.partial(self._cancel_stop_order, account, client, uid, stop_order_id)
+             for stop_order_id in self._get_stop_order_ids(account, client, uid, stop_order_type)
+             if stop_order_id in stop_order_errors})
+
+        if stop_order_errors:
+            raise StopOrderActionsException(
+                f"Failed to cancel {len(stop_order_errors)} stop order(s): " +
+                "; ".join(f"{k}: {v.__class__.__name__} {v}" for k, v in stop_order_errors.items()))
+
+    def _run_stop_order_actions(self, actions: dict[str, typing.Callable]) -> dict[str, Exception]:
+        if len(actions) == 1:
+            (name, action), = actions.items()
+
+            try:
+                action()
+
+                return {}
+            except Exception as ex:
+                return {name: ex}
+
+        futures = {name: self._stop_orders_executor.submit(action) for name, action in actions.items()}
+
+        errors = {}
+
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as ex:
+                errors[name] = ex
+
+        return errors
+
+    def _cancel_stop_order(self, account: trading_account.TradingAccount, client, uid: str, stop_order_id: str):
+        client.stop_orders.cancel_stop_order(account_id=account.id, stop_order_id=stop_order_id)
+
+        account.stop_order_index.remove(uid, stop_order_id)
+
+    def _place_tp(self,
+                  account: trading_account.TradingAccount,
+                  client,
+                  qty: int,
+                  uid: str,
+                  price: Decimal,
+                  position_side: PositionSide):
+        response = client.stop_orders.post_stop_order(
             quantity=qty,
             instrument_id=uid,
             price=decimal_to_quotation(price),
             stop_price=decimal_to_quotation(price),
             direction=StopOrderDirection.STOP_ORDER_DIRECTION_SELL if position_side == PositionSide.LONG
             else StopOrderDirection.STOP_ORDER_DIRECTION_BUY,
-            account_id=self._account_id,
+            account_id=account.id,
             expiration_type=StopOrderExpirationType.STOP_ORDER_EXPIRATION_TYPE_GOOD_TILL_CANCEL,
             stop_order_type=StopOrderType.STOP_ORDER_TYPE_TAKE_PROFIT,
             exchange_order_type=ExchangeOrderType.EXCHANGE_ORDER_TYPE_MARKET,
         )
 
-    def _place_sl(self, client, qty: int, uid: str, price: Decimal, position_side: PositionSide):
-        return client.stop_orders.post_stop_order(
+        account.stop_order_index.add(uid, StopOrderType.STOP_ORDER_TYPE_TAKE_PROFIT, response.stop_order_id)
+
+        return response
+
+    def _place_sl(self,
+                  account: trading_account.TradingAccount,
+                  client,
+                  qty: int,
+                  uid: str,
+                  price: Decimal,
+                  position_side: PositionSide):
+        response = client.stop_orders.post_stop_order(
             quantity=qty,
             instrument_id=uid,
             price=decimal_to_quotation(price),
             stop_price=decimal_to_quotation(price),
             direction=StopOrderDirection.STOP_ORDER_DIRECTION_SELL if position_side == PositionSide.LONG
             else StopOrderDirection.STOP_ORDER_DIRECTION_BUY,
-            account_id=self._account_id,
+            account_id=account.id,
             expiration_type=StopOrderExpirationType.STOP_ORDER_EXPIRATION_TYPE_GOOD_TILL_CANCEL,
             stop_order_type=StopOrderType.STOP_ORDER_TYPE_STOP_LOSS,
             exchange_order_type=ExchangeOrderType.EXCHANGE_ORDER_TYPE_MARKET,
         )
 
+        account.stop_order_index.add(uid, StopOrderType.STOP_ORDER_TYPE_STOP_LOSS, response.stop_order_id)
+
+        return response
+
     def _initial_margins_retriever(self):
-        is_initial = True
+        last_report_ts = self._margin_store.get_state("last_report_ts")
 
         while not self._stop_event.is_set():
             try:
-                tickers = utils.get_all_elements(cfg.tickers_filename)
-
-                curr_initial_margins = {
-                    ticker: initial_margin for ticker, initial_margin in self._retrieve_initial_margins().items()
-                    if ticker in tickers
-                }
+                curr_initial_margins = self._initial_margins_fetcher.fetch(self._ticker_registry.tickers)
 
                 curr_dt = dt.now(timezone.utc)
 
-                if self._prev_initial_margins is None or self._prev_initial_margins_update_day is None:
-                    self._prev_initial_margins = curr_initial_margins
-                    self._prev_initial_margins_update_day = curr_dt.day
+                self._margin_store.append(curr_dt.timestamp(), curr_initial_margins)
 
-                    if curr_dt.hour >= self._stats_hour:
-                        is_initial = False
-                else:
-                    for ticker, initial_margin in curr_initial_margins.items():
-                        if ticker not in self._prev_initial_margins:
-                            self._prev_initial_margins[ticker] = initial_margin
+                report_ts = self._get_stats_report_dt(curr_dt).timestamp()
 
-                    for ticker, initial_margin in self._prev_initial_margins.items():
-                        curr_initial_margin = curr_initial_margins.get(ticker, None)
+                if last_report_ts is None:
+                    last_report_ts = report_ts
 
-                        if curr_initial_margin is None:
-                            continue
+                    self._margin_store.set_state("last_report_ts", last_report_ts)
 
-                        dev_perc = (curr_initial_margin - initial_margin) / initial_margin * 100
-                        prev_alert_dev_perc = self._prev_initial_margins_alerts.get(ticker, None)
+                base = self._margin_store.asof(last_report_ts, curr_initial_margins)
+                curr = self._margin_store.latest(base.index)
 
-                        if abs(dev_perc) >= self._log_step_perc and \
-                                (prev_alert_dev_perc is None or
-                                 abs(abs(prev_alert_dev_perc) - abs(dev_perc)) >= self._log_step_perc):
-                            self._prev_initial_margins_alerts[ticker] = dev_perc
+                dev_perc = (curr - base) / base * 100
+                prev_alert_dev_perc = self._prev_initial_margins_alerts.reindex(dev_perc.index)
 
-                            self._tg_logger.send_tg(
-                                f"Initial margin: {ticker} {initial_margin:.2f}% -> {curr_initial_margin:.2f}% | "
-                                f"delta: {dev_perc}%")
+                alerts = dev_perc[(dev_perc.abs() >= self._log_step_perc) &
+                                  (prev_alert_dev_perc.isna() |
+                                   ((prev_alert_dev_perc.abs() - dev_perc.abs()).abs() >= self._log_step_perc))]
 
-                if (is_initial or curr_dt.day != self._prev_initial_margins_update_day) and \
-                        curr_dt.hour >= self._stats_hour:
-                    is_initial = False
+                if not alerts.empty:
+                    self._prev_initial_margins_alerts = alerts.combine_first(self._prev_initial_margins_alerts)
 
-                    self._prev_initial_margins_alerts = {}
+                    for ticker, alert_dev_perc in alerts.items():
+                        self._tg_logger.send_tg(
+                            f"Initial margin: {ticker} {base[ticker]:.2f}% -> {curr[ticker]:.2f}% | "
+                            f"delta: {alert_dev_perc:.2f}%")
 
-                    sorted_stats = \
-                        dict(sorted({ticker: ((curr_initial_margins[ticker] - self._prev_initial_margins[ticker]) /
-                                              self._prev_initial_margins[ticker]) * 100
-                                     for ticker in set(self._prev_initial_margins) & set(curr_initial_margins)}.items(),
-                                    key=lambda item: abs(item[1]),
-                                    reverse=True))
+                if report_ts > last_report_ts:
+                    last_report_ts = report_ts
 
-                    logging.info(f"Stats 24h: {sorted_stats}")
+                    self._margin_store.set_state("last_report_ts", last_report_ts)
 
-                    if len(sorted_stats) <= 5:
-                        self._tg_logger.send_tg(
-                            "Stats 24h\n" + "\n".join(
-                                f"'{k}' '{self._instruments[k][self._currency].name}' "
-                                f"{self._prev_initial_margins[k]:.2f}% -> {curr_initial_margins[k]:.2f}% "
-                                f"Δ {v:.2f}"
-                                for k, v in sorted_stats.items()))
+                    self._prev_initial_margins_alerts = pd.Series(dtype="float64")
+
+                    stats = self._margin_store.deltas(curr_dt.timestamp(), self.STATS_WINDOWS, curr_initial_margins)
+
+                    stats = stats.loc[stats["24h"].abs().sort_values(ascending=False).index]
+
+                    logging.info(f"Stats 24h: {stats['24h'].round(4).to_dict()}")
+
+                    lines = "\n".join(
+                        f"'{k}' '{self._instruments[k][self._currency].name}' "
+                        f"{row['prev_24h']:.2f}% -> {row['curr']:.2f}% "
+                        f"Δ {row['24h']:.2f} | 1h Δ {row['1h']:.2f} | 7d Δ {row['7d']:.2f}"
+                        for k, row in stats.iterrows())
+
+                    if len(stats) <= 5:
+                        self._tg_logger.send_tg("Stats 24h\n" + lines)
                     else:
                         filename = "stats.txt"
 
                         with open(filename, "w", encoding="utf-8") as f:
-                            f.write("\n".join(
-                                f"'{k}' '{self._instruments[k][self._currency].name}' "
-                                f"{self._prev_initial_margins[k]:.2f}% -> {curr_initial_margins[k]:.2f}% "
-                                f"Δ {v:.2f}"
-                                for k, v in sorted_stats.items()))
+                            f.write(lines)
 
                         self._tg_logger.send_tg_doc("Stats 24h", filename)
 
-                    self._prev_initial_margins = curr_initial_margins
-
-                    self._prev_initial_margins_update_day = curr_dt.day
+                    self._margin_store.compact(curr_dt.timestamp())
 
             except Exception as ex:
                 self._tg_logger.send_tg(f"❌ Error occurred during initial margin update: {ex.__class__.__name__} {ex}")
@@ -588,16 +1172,7 @@ class Bot:
 
             time.sleep(60)
 
-    @staticmethod
-    def _retrieve_initial_margins() -> dict[str, Decimal]:
-        response = requests.get("http://moex.com/export/derivatives/go.aspx?type=F", timeout=10)
-
-        tree = ET.fromstring(response.content)
-        data = {}
-
-        for item in tree.iter("item"):
-            symbol = item.get("symbol")
-
-            data[symbol] = Decimal(item.get("initial_margin_percent"))
+    def _get_stats_report_dt(self, curr_dt: dt) -> dt:
+        report_dt = curr_dt.replace(hour=self._stats_hour, minute=0, second=0, microsecond=0)
 
-        return data
+        return report_dt if report_dt <= curr_dt else report_dt - timedelta(days=1)
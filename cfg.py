@@ -1,8 +1,11 @@
 bot_token = ""
 chat_id = ""
 
+tg_max_backlog = 1000
+tg_coalesce_delay_s = 0.3
+
 tinkoff_token = ""
-account_name = ""
+account_names = [""]
 currency = "rub"
 
 ip = "0.0.0.0"
@@ -11,13 +14,32 @@ port = 443
 cert_path = "cert.pem"
 key_path = "key.pem"
 
+ingress_mode = "gunicorn"  # gunicorn | flask
+ingress_workers = 2
+ingress_threads = 16
+ingress_keepalive_s = 75
+ingress_max_connections = 256
+ingress_backlog = 512
+ingress_drain_timeout_s = 10
+
+webhook_buffer_size = 4 * 1024 * 1024
+
+liveness_check_interval_s = 0.2
+heartbeat_timeout_s = 5  # workers beat at least once a second
+server_startup_timeout_s = 10
+
 tickers_filename = "tickers.txt"
+tickers_compact_interval_s = 600
+ticker_resolver_cache_size = 1024
 
 log_step_perc = 5.0
 
 windows_str = ["22:36:00-22:39:00"]  # UTC
 stats_hour = 19  # UTC
 
+margin_store_dirname = "margins"
+margin_store_retention_s = 8 * 24 * 60 * 60
+
 ip_whitelist = \
     [
         "52.89.214.238",
@@ -26,7 +48,41 @@ ip_whitelist = \
         "52.32.178.7"
     ]
 
+metrics_ip_whitelist = ["127.0.0.1"]
+
 min_money_coefficient = 2
 
 max_verify_attempts = 10
 verify_delay_s = 0.5
+
+client_pool_size = 2
+client_health_check_interval_s = 30
+client_keepalive_time_ms = 30000
+
+instruments_snapshot_filename = "instruments.snapshot"
+instruments_snapshot_max_age_s = 7 * 24 * 60 * 60
+
+execution_engine = "thread"  # thread | asyncio
+max_in_flight_orders = 8
+
+trades_stream_reconnect_delay_s = 1
+
+positions_stream_reconnect_delay_s = 1
+positions_reconcile_interval_s = 300
+
+last_price_max_age_s = 5
+market_data_stream_reconnect_delay_s = 1
+
+margin_reconcile_interval_s = 60
+margin_reconcile_after_fills = 5
+margin_max_age_s = 180
+
+stop_orders_reconcile_interval_s = 60
+stop_orders_max_workers = 8
+
+dedup_ttl_s = 60
+dedup_hash_ttl_s = 0  # webhooks without dedup_id_field are only deduplicated by body within this window
+dedup_max_entries = 10000
+dedup_id_field = "id"
+
+batch_max_workers = 16
@@ -0,0 +1,315 @@
+from tinkoff.invest.exceptions import RequestError
+from contextlib import contextmanager
+from tinkoff.invest import Client
+import itertools
+import functools
+import threading
+import typing
+import logging
+import grpc
+import time
+
+import metrics
+
+
+class ClientPoolClosedException(Exception):
+    pass
+
+
+def _get_status_code(ex: Exception) -> grpc.StatusCode | None:
+    if isinstance(ex, RequestError):
+        return ex.code
+
+    if isinstance(ex, grpc.RpcError):
+        return ex.code()
+
+    return None
+
+
+class _InstrumentedService:
+    def __init__(self, service, rpc_metrics: metrics.Metrics, on_error: typing.Callable[[Exception], None]):
+        self._service = service
+        self._metrics = rpc_metrics
+        self._on_error = on_error
+
+    def __getattr__(self, name: str):
+        method = getattr(self._service, name)
+
+        if not callable(method):
+            return method
+
+        rpc_metrics = self._metrics
+        on_error = self._on_error
+        label = name if name in metrics.RPC_METHODS else "other"
+
+        def call(*args, **kwargs):
+            st = time.perf_counter()
+
+            try:
+                return method(*args, **kwargs)
+            except Exception as ex:
+                rpc_metrics.rpc_errors.inc(label)
+
+                on_error(ex)
+
+                raise
+            finally:
+                rpc_metrics.rpc_seconds.observe(label, time.perf_counter() - st)
+
+        self.__dict__[name] = call
+
+        return call
+
+
+class _InstrumentedServices:
+    def __init__(self, services, rpc_metrics: metrics.Metrics, on_error: typing.Callable[[Exception], None]):
+        self._services = services
+        self._metrics = rpc_metrics
+        self._on_error = on_error
+
+    def __getattr__(self, name: str):
+        service = getattr(self._services, name)
+
+        if not name.endswith("_stream"):
+            service = _InstrumentedService(service, self._metrics, self._on_error)
+
+        self.__dict__[name] = service
+
+        return service
+
+
+class _Channel:
+    def __init__(self, client, services: _InstrumentedServices):
+        self.client = client
+        self.services = services
+        self.users = 0
+        self.is_retired = False
+
+
+class _PooledClient:
+    def __init__(self,
+                 index: int,
+                 token: str,
+                 options: list[tuple[str, int]],
+                 rpc_metrics: metrics.Metrics,
+                 client_factory: typing.Callable,
+                 on_error: typing.Callable[[Exception], None]):
+        self.index = index
+
+        self._token = token
+        self._options = options
+        self._metrics = rpc_metrics
+        self._client_factory = client_factory
+        self._on_error = on_error
+
+        self._channel: _Channel | None = None
+
+        self._lock = threading.Lock()
+
+    @property
+    def services(self):
+        channel = self._channel
+
+        return channel.services if channel is not None else None
+
+    def connect(self):
+        client = self._client_factory(self._token, options=self._options)
+
+        channel = _Channel(client, _InstrumentedServices(client.__enter__(), self._metrics, self._on_error))
+
+        with self._lock:
+            prev_channel = self._channel
+
+            self._channel = channel
+
+            if prev_channel is not None:
+                prev_channel.is_retired = True
+
+            # Calls and streams still running on the previous channel keep it open until the last one is released.
+            is_prev_unused = prev_channel is not None and prev_channel.users == 0
+
+        if is_prev_unused:
+            self._close(prev_channel.client)
+
+    def acquire(self) -> _Channel | None:
+        with self._lock:
+            channel = self._channel
+
+            if channel is not None:
+                channel.users += 1
+
+            return channel
+
+    def release(self, channel: _Channel):
+        with self._lock:
+            channel.users -= 1
+
+            is_unused = channel.is_retired and channel.users == 0
+
+        if is_unused:
+            self._close(channel.client)
+
+    def close(self):
+        with self._lock:
+            prev_channel = self._channel
+
+            self._channel = None
+
+            if prev_channel is not None:
+                prev_channel.is_retired = True
+
+        if prev_channel is not None:
+            self._close(prev_channel.client)
+
+    def _close(self, client):
+        if client is None:
+            return
+
+        try:
+            client.__exit__(None, None, None)
+        except Exception as ex:
+            logging.warning(f"Error closing pooled client #{self.index}: {ex.__class__.__name__} {ex}")
+
+
+class ClientPool:
+    _RECONNECT_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.INTERNAL, grpc.StatusCode.UNKNOWN)
+
+    def __init__(self,
+                 tinkoff_token: str,
+                 size: int,
+                 health_check_interval_s: float,
+                 keepalive_time_ms: int,
+                 rpc_metrics: metrics.Metrics,
+                 client_factory: typing.Callable = Client):
+        options = [
+            ("grpc.keepalive_time_ms", keepalive_time_ms),
+            ("grpc.keepalive_timeout_ms", max(keepalive_time_ms // 3, 1000)),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.max_pings_without_data", 0),
+        ]
+
+        self._clients = [_PooledClient(i, tinkoff_token, options, rpc_metrics, client_factory,
+                                       functools.partial(self._on_rpc_error, i))
+                         for i in range(max(size, 1))]
+        self._health_check_interval_s = health_check_interval_s
+
+        self._counter = itertools.count()
+
+        self._stale: set[int] = set()
+        self._stale_lock = threading.Lock()
+        self._reconnect_lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+
+        self._health_checker_thread = threading.Thread(target=self._health_checker, daemon=True)
+
+    def start(self):
+        for pooled in self._clients:
+            pooled.connect()
+
+        self._health_checker_thread.start()
+
+        logging.info(f"Client pool started with {len(self._clients)} channel(s).")
+
+    def close(self):
+        self._stop_event.set()
+
+        if self._health_checker_thread.is_alive():
+            self._health_checker_thread.join()
+
+        for pooled in self._clients:
+            pooled.close()
+
+        logging.info("Client pool closed.")
+
+    @contextmanager
+    def client(self):
+        if self._stop_event.is_set():
+            raise ClientPoolClosedException("Client pool is closed!")
+
+        pooled = self._pick()
+
+        channel = pooled.acquire()
+
+        if channel is None:
+            pooled.connect()
+
+            channel = pooled.acquire()
+
+        try:
+            yield channel.services
+        except (RequestError, grpc.RpcError) as ex:
+            self._on_rpc_error(pooled.index, ex)
+
+            raise
+        finally:
+            pooled.release(channel)
+
+    def _pick(self) -> _PooledClient:
+        start = next(self._counter)
+
+        with self._stale_lock:
+            stale = set(self._stale)
+
+        for i in range(len(self._clients)):
+            pooled = self._clients[(start + i) % len(self._clients)]
+
+            if pooled.index not in stale:
+                return pooled
+
+        pooled = self._clients[start % len(self._clients)]
+
+        self._reconnect(pooled)
+
+        return pooled
+
+    def _reconnect(self, pooled: _PooledClient):
+        with self._reconnect_lock:
+            with self._stale_lock:
+                if pooled.index not in self._stale:
+                    return
+
+            pooled.connect()
+
+            with self._stale_lock:
+                self._stale.discard(pooled.index)
+
+        logging.info(f"Pooled client #{pooled.index} reconnected.")
+
+    def _on_rpc_error(self, index: int, ex: Exception):
+        if _get_status_code(ex) not in self._RECONNECT_CODES:
+            return
+
+        with self._stale_lock:
+            if index in self._stale:
+                return
+
+            self._stale.add(index)
+
+        logging.warning(f"Pooled client #{index} marked for reconnect.")
+
+    def _health_checker(self):
+        while not self._stop_event.wait(self._health_check_interval_s):
+            for pooled in self._clients:
+                with self._stale_lock:
+                    is_stale = pooled.index in self._stale
+
+                if not is_stale:
+                    try:
+                        pooled.services.users.get_info()
+                    except Exception as ex:
+                        logging.warning(f"Health check of pooled client #{pooled.index} failed: "
+                                        f"{ex.__class__.__name__} {ex}")
+
+                        with self._stale_lock:
+                            self._stale.add(pooled.index)
+
+                        is_stale = True
+
+                if not is_stale:
+                    continue
+
+                try:
+                    self._reconnect(pooled)
+                except Exception as ex:
+                    logging.error(f"Error reconnecting pooled client #{pooled.index}: {ex.__class__.__name__} {ex}")
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import threading
+import hashlib
+import time
+
+
+class DedupIndex:
+    def __init__(self, ttl_s: float, hash_ttl_s: float, max_entries: int, id_field: str):
+        self._ttl_s = ttl_s
+        self._hash_ttl_s = hash_ttl_s
+        self._max_entries = max_entries
+        self._id_field = id_field
+
+        self._expires_at: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._duplicates = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self._duplicates
+
+    @property
+    def size(self) -> int:
+        return len(self._expires_at)
+
+    def get_key(self, data: dict, raw_data: bytes) -> str:
+        explicit_id = data.get(self._id_field) if isinstance(data, dict) else None
+
+        if explicit_id is not None:
+            return f"id:{explicit_id}"
+
+        return f"hash:{hashlib.blake2b(raw_data, digest_size=16).hexdigest()}"
+
+    def check_and_add(self, key: str) -> bool:
+        ttl_s = self._hash_ttl_s if key.startswith("hash:") else self._ttl_s
+
+        if ttl_s <= 0:
+            return False
+
+        now = time.monotonic()
+
+        with self._lock:
+            while self._expires_at:
+                oldest_key, expires_at = next(iter(self._expires_at.items()))
+
+                if expires_at > now:
+                    break
+
+                del self._expires_at[oldest_key]
+
+            # Entries with the shorter hash TTL may sit behind longer-lived ones, so expiry is checked per key too.
+            if self._expires_at.get(key, 0) > now:
+                self._duplicates += 1
+
+                return True
+
+            self._expires_at.pop(key, None)
+            self._expires_at[key] = now + ttl_s
+
+            if len(self._expires_at) > self._max_entries:
+                self._expires_at.popitem(last=False)
+
+        return False
+
+    def discard(self, key: str):
+        with self._lock:
+            self._expires_at.pop(key, None)
@@ -0,0 +1,70 @@
+from datetime import datetime as dt
+from typing import Callable, Any
+import itertools
+import threading
+import logging
+import heapq
+import time
+
+
+class DeferredScheduler:
+    def __init__(self, callback: Callable[[Any], None]):
+        self._callback = callback
+
+        self._heap: list[tuple[float, int, Any]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+        self._stop_event = threading.Event()
+
+        self._scheduler_thread = threading.Thread(target=self._scheduler)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._heap)
+
+    @property
+    def next_due(self) -> float | None:
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    def start(self):
+        self._scheduler_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+        with self._condition:
+            self._condition.notify()
+
+        if self._scheduler_thread.is_alive():
+            self._scheduler_thread.join()
+
+        if self._heap:
+            logging.warning(f"Deferred scheduler stopped with {len(self._heap)} pending item(s).")
+
+    def schedule(self, due: dt, item: Any):
+        with self._condition:
+            heapq.heappush(self._heap, (due.timestamp(), next(self._counter), item))
+
+            self._condition.notify()
+
+    def _scheduler(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                while not self._stop_event.is_set() and (not self._heap or self._heap[0][0] > time.time()):
+                    self._condition.wait(timeout=self._heap[0][0] - time.time() if self._heap else None)
+
+                if self._stop_event.is_set():
+                    return
+
+                due_items = []
+
+                while self._heap and self._heap[0][0] <= time.time():
+                    due_items.append(heapq.heappop(self._heap)[2])
+
+            for item in due_items:
+                try:
+                    self._callback(item)
+                except Exception as ex:
+                    logging.error(f"Error handling deferred item: {ex.__class__.__name__} {ex}")
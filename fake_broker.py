@@ -0,0 +1,427 @@
+from tinkoff.invest import (Account, GetAccountsResponse, GetInfoResponse, GetMarginAttributesResponse, MoneyValue,
+                            FuturesResponse, SharesResponse, EtfsResponse, PostOrderResponse, OrderState,
+                            OrderExecutionReportStatus, OrderDirection, GetLastPricesResponse, LastPrice,
+                            PositionsResponse, PositionsSecurities, PositionsFutures, PostStopOrderResponse,
+                            GetStopOrdersResponse, StopOrder, CancelStopOrderResponse, TradesStreamResponse,
+                            OrderTrades, PositionsStreamResponse, PositionData, MarketDataResponse, Ping,
+                            Share, Future, Etf)
+from tinkoff.invest.utils import decimal_to_quotation, quotation_to_decimal
+from datetime import datetime, timezone
+from collections import defaultdict
+from decimal import Decimal
+import itertools
+import threading
+import typing
+import queue
+import time
+import uuid
+
+
+class FakeBrokerClosedException(Exception):
+    pass
+
+
+class FakeBroker:
+    def __init__(self,
+                 account_name: str,
+                 instruments: list[Future | Share | Etf],
+                 prices: dict[str, Decimal],
+                 liquid_portfolio: Decimal,
+                 latencies_s: dict[str, float],
+                 default_latency_s: float,
+                 fill_delay_s: float):
+        self._account = Account(id=uuid.uuid4().hex, name=account_name)
+        self._instruments = {instrument.uid: instrument for instrument in instruments}
+        self._prices = prices
+        self._liquid_portfolio = liquid_portfolio
+        self._latencies_s = latencies_s
+        self._default_latency_s = default_latency_s
+        self._fill_delay_s = fill_delay_s
+
+        self._balances: dict[str, int] = defaultdict(int)
+        self._orders: dict[str, OrderState] = {}
+        self._stop_orders: dict[str, StopOrder] = {}
+        self._lock = threading.Lock()
+
+        self._order_ids = itertools.count(1)
+
+        self._subscribers: dict[str, list[queue.Queue]] = defaultdict(list)
+        self._subscribers_lock = threading.Lock()
+
+        self._calls: list[tuple[float, str, str | None]] = []
+        self._calls_lock = threading.Lock()
+
+        self._closed = threading.Event()
+
+    @property
+    def account_id(self) -> str:
+        return self._account.id
+
+    def client(self, _token: str, options: list | None = None) -> "_FakeClient":
+        return _FakeClient(self)
+
+    def close(self):
+        self._closed.set()
+
+    def get_calls(self, since: float = 0.0) -> list[tuple[float, str, str | None]]:
+        with self._calls_lock:
+            return [call for call in self._calls if call[0] >= since]
+
+    def call(self, method: str, uid: str | None = None):
+        if self._closed.is_set():
+            raise FakeBrokerClosedException("Fake broker is closed!")
+
+        with self._calls_lock:
+            self._calls.append((time.perf_counter(), method, uid))
+
+        latency_s = self._latencies_s.get(method, self._default_latency_s)
+
+        if latency_s > 0:
+            time.sleep(latency_s)
+
+    def get_accounts(self) -> GetAccountsResponse:
+        self.call("get_accounts")
+
+        return GetAccountsResponse(accounts=[self._account])
+
+    def get_info(self) -> GetInfoResponse:
+        self.call("get_info")
+
+        return GetInfoResponse()
+
+    def get_margin_attributes(self) -> GetMarginAttributesResponse:
+        self.call("get_margin_attributes")
+
+        with self._lock:
+            starting_margin = sum((self._instrument_margin(uid, balance) for uid, balance in self._balances.items()),
+                                  Decimal(0))
+
+        return GetMarginAttributesResponse(liquid_portfolio=self._money(self._liquid_portfolio),
+                                           starting_margin=self._money(starting_margin))
+
+    def get_instruments(self, kind: type) -> list:
+        self.call(f"{kind.__name__.lower()}s")
+
+        return [instrument for instrument in self._instruments.values() if type(instrument) is kind]
+
+    def get_last_prices(self, uids: list[str]) -> GetLastPricesResponse:
+        self.call("get_last_prices", uids[0] if len(uids) == 1 else None)
+
+        return GetLastPricesResponse(last_prices=[self.last_price(uid) for uid in uids])
+
+    def get_positions(self) -> PositionsResponse:
+        self.call("get_positions")
+
+        with self._lock:
+            securities, futures = self._positions(list(self._balances))
+
+        return PositionsResponse(securities=securities, futures=futures)
+
+    def post_order(self, uid: str, quantity: int, direction: OrderDirection) -> PostOrderResponse:
+        self.call("post_order", uid)
+
+        order_id = str(next(self._order_ids))
+
+        instrument = self._instruments[uid]
+
+        instrument_price = self._prices[uid] * \
+            (1 if type(instrument) is not Future else
+             quotation_to_decimal(instrument.min_price_increment_amount) /
+             quotation_to_decimal(instrument.min_price_increment))
+
+        executed_order_price = instrument_price * quantity * instrument.lot
+
+        order_state = OrderState(order_id=order_id,
+                                 execution_report_status=OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL,
+                                 lots_requested=quantity,
+                                 lots_executed=quantity,
+                                 executed_order_price=self._money(executed_order_price),
+                                 instrument_uid=uid)
+
+        signed_quantity = quantity if direction == OrderDirection.ORDER_DIRECTION_BUY else -quantity
+
+        if self._fill_delay_s <= 0:
+            self._fill(order_state, signed_quantity)
+
+            return PostOrderResponse(order_id=order_id,
+                                     execution_report_status=order_state.execution_report_status,
+                                     lots_requested=quantity,
+                                     lots_executed=quantity,
+                                     executed_order_price=self._money(instrument_price),
+                                     instrument_uid=uid)
+
+        with self._lock:
+            self._orders[order_id] = OrderState(
+                order_id=order_id,
+                execution_report_status=OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW,
+                lots_requested=quantity,
+                lots_executed=0,
+                executed_order_price=self._money(Decimal(0)),
+                instrument_uid=uid)
+
+        timer = threading.Timer(self._fill_delay_s, self._fill, args=(order_state, signed_quantity))
+        timer.daemon = True
+        timer.start()
+
+        return PostOrderResponse(order_id=order_id,
+                                 execution_report_status=OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW,
+                                 lots_requested=quantity,
+                                 lots_executed=0,
+                                 executed_order_price=self._money(Decimal(0)),
+                                 instrument_uid=uid)
+
+    def get_order_state(self, order_id: str) -> OrderState:
+        self.call("get_order_state")
+
+        with self._lock:
+            return self._orders[order_id]
+
+    def post_stop_order(self, uid: str, stop_order_type) -> PostStopOrderResponse:
+        self.call("post_stop_order", uid)
+
+        stop_order_id = uuid.uuid4().hex
+
+        with self._lock:
+            self._stop_orders[stop_order_id] = StopOrder(stop_order_id=stop_order_id,
+                                                         instrument_uid=uid,
+                                                         order_type=stop_order_type)
+
+        return PostStopOrderResponse(stop_order_id=stop_order_id)
+
+    def get_stop_orders(self) -> GetStopOrdersResponse:
+        self.call("get_stop_orders")
+
+        with self._lock:
+            return GetStopOrdersResponse(stop_orders=list(self._stop_orders.values()))
+
+    def cancel_stop_order(self, stop_order_id: str) -> CancelStopOrderResponse:
+        with self._lock:
+            stop_order = self._stop_orders.get(stop_order_id)
+
+        self.call("cancel_stop_order", stop_order.instrument_uid if stop_order is not None else None)
+
+        with self._lock:
+            self._stop_orders.pop(stop_order_id, None)
+
+        return CancelStopOrderResponse()
+
+    def stream(self, name: str, idle_response: typing.Callable[[], typing.Any]) -> typing.Iterator:
+        events = queue.Queue()
+
+        with self._subscribers_lock:
+            self._subscribers[name].append(events)
+
+        return self._iterate(name, events, idle_response)
+
+    def _iterate(self,
+                 name: str,
+                 events: queue.Queue,
+                 idle_response: typing.Callable[[], typing.Any]) -> typing.Iterator:
+        try:
+            while not self._closed.is_set():
+                try:
+                    yield events.get(timeout=0.5)
+                except queue.Empty:
+                    yield idle_response()
+        finally:
+            with self._subscribers_lock:
+                self._subscribers[name].remove(events)
+
+    def publish(self, name: str, event):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers[name])
+
+        for events in subscribers:
+            events.put(event)
+
+    def _fill(self, order_state: OrderState, signed_quantity: int):
+        uid = order_state.instrument_uid
+
+        with self._lock:
+            self._orders[order_state.order_id] = order_state
+
+            self._balances[uid] += signed_quantity
+
+            if self._balances[uid] == 0:
+                del self._balances[uid]
+
+            securities, futures = self._positions([uid])
+
+        self.publish("trades", TradesStreamResponse(order_trades=OrderTrades(order_id=order_state.order_id,
+                                                                             account_id=self._account.id,
+                                                                             instrument_uid=uid)))
+
+        self.publish("positions", PositionsStreamResponse(position=PositionData(account_id=self._account.id,
+                                                                                securities=securities,
+                                                                                futures=futures)))
+
+    def _positions(self, uids: list[str]) -> tuple[list[PositionsSecurities], list[PositionsFutures]]:
+        securities, futures = [], []
+
+        for uid in uids:
+            instrument = self._instruments[uid]
+            balance = self._balances.get(uid, 0)
+
+            if type(instrument) is Future:
+                futures.append(PositionsFutures(figi=instrument.figi, instrument_uid=uid, balance=balance))
+            else:
+                securities.append(PositionsSecurities(figi=instrument.figi, instrument_uid=uid, balance=balance))
+
+        return securities, futures
+
+    def _instrument_margin(self, uid: str, balance: int) -> Decimal:
+        instrument = self._instruments[uid]
+
+        return abs(balance) * self._prices[uid] * quotation_to_decimal(instrument.dlong) * \
+            (instrument.lot if type(instrument) is not Future else
+             quotation_to_decimal(instrument.min_price_increment_amount) /
+             quotation_to_decimal(instrument.min_price_increment))
+
+    def last_price(self, uid: str) -> LastPrice:
+        return LastPrice(figi=self._instruments[uid].figi,
+                         price=decimal_to_quotation(self._prices[uid]),
+                         time=datetime.now(timezone.utc),
+                         instrument_uid=uid)
+
+    def _money(self, value: Decimal) -> MoneyValue:
+        quotation = decimal_to_quotation(value)
+
+        return MoneyValue(currency=next(iter(self._instruments.values())).currency,
+                          units=quotation.units,
+                          nano=quotation.nano)
+
+
+class _FakeClient:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def __enter__(self) -> "_FakeServices":
+        return _FakeServices(self._broker)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class _FakeServices:
+    def __init__(self, broker: FakeBroker):
+        self.users = _Users(broker)
+        self.instruments = _Instruments(broker)
+        self.market_data = _MarketData(broker)
+        self.market_data_stream = _MarketDataStream(broker)
+        self.operations = _Operations(broker)
+        self.operations_stream = _OperationsStream(broker)
+        self.orders = _Orders(broker)
+        self.orders_stream = _OrdersStream(broker)
+        self.stop_orders = _StopOrders(broker)
+
+
+class _Users:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def get_accounts(self) -> GetAccountsResponse:
+        return self._broker.get_accounts()
+
+    def get_info(self) -> GetInfoResponse:
+        return self._broker.get_info()
+
+    def get_margin_attributes(self, account_id: str) -> GetMarginAttributesResponse:
+        return self._broker.get_margin_attributes()
+
+
+class _Instruments:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def futures(self) -> FuturesResponse:
+        return FuturesResponse(instruments=self._broker.get_instruments(Future))
+
+    def shares(self) -> SharesResponse:
+        return SharesResponse(instruments=self._broker.get_instruments(Share))
+
+    def etfs(self) -> EtfsResponse:
+        return EtfsResponse(instruments=self._broker.get_instruments(Etf))
+
+
+class _MarketData:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def get_last_prices(self, instrument_id: list[str]) -> GetLastPricesResponse:
+        return self._broker.get_last_prices(instrument_id)
+
+
+class _MarketDataStream:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def market_data_stream(self, request_iterator: typing.Iterator) -> typing.Iterator[MarketDataResponse]:
+        responses = self._broker.stream("market_data", lambda: MarketDataResponse(
+            last_price=None, ping=Ping(time=datetime.now(timezone.utc))))
+
+        threading.Thread(target=self._read_requests, args=(request_iterator,), daemon=True).start()
+
+        return responses
+
+    def _read_requests(self, request_iterator: typing.Iterator):
+        for request in request_iterator:
+            subscribe_request = request.subscribe_last_price_request
+
+            if subscribe_request is None:
+                continue
+
+            for instrument in subscribe_request.instruments:
+                self._broker.publish("market_data",
+                                     MarketDataResponse(last_price=self._broker.last_price(instrument.instrument_id)))
+
+
+class _Operations:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def get_positions(self, account_id: str) -> PositionsResponse:
+        return self._broker.get_positions()
+
+
+class _OperationsStream:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def positions_stream(self, accounts: list[str]) -> typing.Iterator[PositionsStreamResponse]:
+        return self._broker.stream("positions", lambda: PositionsStreamResponse(
+            position=None, ping=Ping(time=datetime.now(timezone.utc))))
+
+
+class _Orders:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def post_order(self, instrument_id: str, quantity: int, account_id: str, direction: OrderDirection,
+                   order_type=None, **kwargs) -> PostOrderResponse:
+        return self._broker.post_order(instrument_id, quantity, direction)
+
+    def get_order_state(self, account_id: str, order_id: str) -> OrderState:
+        return self._broker.get_order_state(order_id)
+
+
+class _OrdersStream:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def trades_stream(self, accounts: list[str]) -> typing.Iterator[TradesStreamResponse]:
+        return self._broker.stream("trades", lambda: TradesStreamResponse(
+            order_trades=None, ping=Ping(time=datetime.now(timezone.utc))))
+
+
+class _StopOrders:
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def post_stop_order(self, instrument_id: str, stop_order_type, **kwargs) -> PostStopOrderResponse:
+        return self._broker.post_stop_order(instrument_id, stop_order_type)
+
+    def get_stop_orders(self, account_id: str, **kwargs) -> GetStopOrdersResponse:
+        return self._broker.get_stop_orders()
+
+    def cancel_stop_order(self, account_id: str, stop_order_id: str) -> CancelStopOrderResponse:
+        return self._broker.cancel_stop_order(stop_order_id)
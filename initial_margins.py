@@ -0,0 +1,104 @@
+from xml.etree import ElementTree as ET
+from decimal import Decimal
+import requests
+import logging
+import time
+
+
+class _CountingReader:
+    def __init__(self, raw):
+        self._raw = raw
+
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+
+        self.bytes_read += len(data)
+
+        return data
+
+
+class InitialMarginsFetcher:
+    URL = "http://moex.com/export/derivatives/go.aspx?type=F"
+
+    def __init__(self, timeout_s: float):
+        self._timeout_s = timeout_s
+
+        self._session = requests.Session()
+
+        self._etag: str | None = None
+        self._last_modified: str | None = None
+
+        self._data: dict[str, Decimal] = {}
+        self._data_tickers: frozenset[str] = frozenset()
+
+        self.last_status_code: int | None = None
+        self.last_bytes_fetched = 0
+        self.last_bytes_parsed = 0
+        self.last_fetch_s = 0.0
+        self.last_parse_s = 0.0
+
+    def close(self):
+        self._session.close()
+
+    def fetch(self, tickers: frozenset[str]) -> dict[str, Decimal]:
+        headers = {}
+
+        if tickers <= self._data_tickers:
+            if self._etag is not None:
+                headers["If-None-Match"] = self._etag
+
+            if self._last_modified is not None:
+                headers["If-Modified-Since"] = self._last_modified
+
+        st = time.perf_counter()
+
+        with self._session.get(self.URL, headers=headers, timeout=self._timeout_s, stream=True) as response:
+            self.last_status_code = response.status_code
+
+            if response.status_code == 304:
+                self.last_bytes_fetched, self.last_bytes_parsed, self.last_parse_s = 0, 0, 0.0
+                self.last_fetch_s = time.perf_counter() - st
+
+                logging.debug(f"Initial margins not modified, fetch: {self.last_fetch_s * 1000:.1f}ms.")
+
+                return {ticker: value for ticker, value in self._data.items() if ticker in tickers}
+
+            response.raise_for_status()
+
+            response.raw.decode_content = True
+
+            reader = _CountingReader(response.raw)
+
+            parse_st = time.perf_counter()
+
+            data = {}
+
+            for _, elem in ET.iterparse(reader, events=("end",)):
+                if elem.tag != "item":
+                    continue
+
+                symbol = elem.get("symbol")
+
+                if symbol in tickers:
+                    data[symbol] = Decimal(elem.get("initial_margin_percent"))
+
+                elem.clear()
+
+            self.last_parse_s = time.perf_counter() - parse_st
+            self.last_fetch_s = time.perf_counter() - st
+            self.last_bytes_parsed = reader.bytes_read
+            self.last_bytes_fetched = response.raw.tell()
+
+            self._etag = response.headers.get("ETag")
+            self._last_modified = response.headers.get("Last-Modified")
+
+        self._data = data
+        self._data_tickers = tickers
+
+        logging.debug(f"Initial margins fetched: {len(data)} tracked items, "
+                      f"{self.last_bytes_fetched} bytes fetched, {self.last_bytes_parsed} bytes parsed, "
+                      f"fetch: {self.last_fetch_s * 1000:.1f}ms, parse: {self.last_parse_s * 1000:.1f}ms.")
+
+        return data
@@ -0,0 +1,94 @@
+from tinkoff.invest.utils import quotation_to_decimal
+from tinkoff.invest import Share, Future, Etf
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+import typing
+
+import utils
+
+
+class InstrumentKind(utils.BaseEnum):
+    SHARE = "share"
+    FUTURE = "future"
+    ETF = "etf"
+
+
+_KINDS = {Share: InstrumentKind.SHARE, Future: InstrumentKind.FUTURE, Etf: InstrumentKind.ETF}
+
+
+class InstrumentRecord:
+    __slots__ = ("uid", "figi", "ticker", "name", "currency", "kind", "lot", "tick_size", "price_decimals",
+                 "point_value", "dlong", "dshort", "expiration_date")
+
+    def __init__(self,
+                 uid: str,
+                 figi: str,
+                 ticker: str,
+                 name: str,
+                 currency: str,
+                 kind: InstrumentKind | None,
+                 lot: int,
+                 tick_size: Decimal,
+                 point_value: Decimal,
+                 dlong: Decimal,
+                 dshort: Decimal,
+                 expiration_date: datetime | None):
+        self.uid = uid
+        self.figi = figi
+        self.ticker = ticker
+        self.name = name
+        self.currency = currency
+        self.kind = kind
+        self.lot = lot
+        self.tick_size = tick_size
+        self.price_decimals = max(-tick_size.normalize().as_tuple().exponent, 0)
+        self.point_value = point_value
+        self.dlong = dlong
+        self.dshort = dshort
+        self.expiration_date = expiration_date
+
+    @classmethod
+    def from_instrument(cls, instrument: Future | Share | Etf) -> "InstrumentRecord":
+        kind = _KINDS.get(type(instrument))
+
+        tick_size = quotation_to_decimal(instrument.min_price_increment)
+
+        if kind == InstrumentKind.FUTURE and tick_size:
+            point_value = quotation_to_decimal(instrument.min_price_increment_amount) / tick_size
+        else:
+            point_value = Decimal(1)
+
+        return cls(instrument.uid,
+                   instrument.figi,
+                   instrument.ticker,
+                   instrument.name,
+                   instrument.currency,
+                   kind,
+                   instrument.lot,
+                   tick_size,
+                   point_value,
+                   quotation_to_decimal(instrument.dlong),
+                   quotation_to_decimal(instrument.dshort),
+                   getattr(instrument, "expiration_date", None))
+
+    def round_price(self, price: Decimal) -> Decimal:
+        return utils.round_price(price, self.tick_size, self.price_decimals)
+
+    def __repr__(self):
+        return f"InstrumentRecord({self.kind.value if self.kind else None} '{self.ticker}' '{self.currency}' {self.uid})"
+
+
+def build_catalogue(items: typing.Iterable[Future | Share | Etf]) \
+        -> tuple[dict[str, dict[str, InstrumentRecord]], dict[str, InstrumentRecord]]:
+    records = defaultdict(dict)
+    records_by_uid = {}
+
+    for item in items:
+        record = InstrumentRecord.from_instrument(item)
+
+        records[record.ticker][record.currency] = record
+
+        records_by_uid[record.uid] = record
+
+    return records, records_by_uid
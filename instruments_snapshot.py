@@ -0,0 +1,79 @@
+from tinkoff.invest import Share, Future, Etf
+import dataclasses
+import hashlib
+import logging
+import pickle
+import struct
+import time
+import mmap
+import os
+
+MAGIC = b"TINS"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sH16sdQ")
+
+
+class SnapshotException(Exception):
+    pass
+
+
+def _schema_fingerprint() -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+
+    for cls in (Future, Share, Etf):
+        digest.update(cls.__name__.encode())
+
+        for field in dataclasses.fields(cls):
+            digest.update(field.name.encode())
+
+    return digest.digest()
+
+
+SCHEMA_FINGERPRINT = _schema_fingerprint()
+
+
+def save(filename: str, instruments_by_uid: dict):
+    payload = pickle.dumps(list(instruments_by_uid.values()), protocol=pickle.HIGHEST_PROTOCOL)
+
+    tmp_filename = f"{filename}.tmp"
+
+    with open(tmp_filename, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, SCHEMA_FINGERPRINT, time.time(), len(payload)))
+        f.write(payload)
+
+    os.replace(tmp_filename, filename)
+
+
+def load(filename: str, max_age_s: float) -> tuple[dict, float] | None:
+    try:
+        with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if len(mm) < _HEADER.size:
+                raise SnapshotException(f"Snapshot '{filename}' is truncated!")
+
+            magic, version, fingerprint, created_at, payload_size = _HEADER.unpack_from(mm)
+
+            if magic != MAGIC:
+                raise SnapshotException(f"Snapshot '{filename}' has unknown format!")
+
+            if version != FORMAT_VERSION or fingerprint != SCHEMA_FINGERPRINT:
+                raise SnapshotException(f"Snapshot '{filename}' version mismatch: {version}!")
+
+            if len(mm) != _HEADER.size + payload_size:
+                raise SnapshotException(f"Snapshot '{filename}' is truncated!")
+
+            age_s = time.time() - created_at
+
+            if age_s > max_age_s:
+                raise SnapshotException(f"Snapshot '{filename}' is stale: {age_s:.0f}s > {max_age_s}s!")
+
+            with memoryview(mm)[_HEADER.size:] as payload:
+                items = pickle.loads(payload)
+    except FileNotFoundError:
+        return None
+    except (SnapshotException, pickle.UnpicklingError, EOFError, ValueError, AttributeError) as ex:
+        logging.warning(f"Instruments snapshot ignored: {ex.__class__.__name__} {ex}")
+
+        return None
+
+    return {item.uid: item for item in items}, created_at
@@ -1,31 +1,184 @@
 import traceback
+import threading
 import requests
+import logging
+import queue
+import time
+import os
+
 import utils
 
 
 class TgLogger:
-    def __init__(self, bot_token: str, chat_id: str):
+    MAX_MESSAGE_LENGTH = 4096
+
+    def __init__(self,
+                 bot_token: str,
+                 chat_id: str,
+                 max_backlog: int = 1000,
+                 coalesce_delay_s: float = 0.3,
+                 max_retries: int = 5):
         self._bot_token = bot_token
         self._chat_id = chat_id
+        self._max_backlog = max_backlog
+        self._coalesce_delay_s = coalesce_delay_s
+        self._max_retries = max_retries
+
+        self._session = None
+        self._queue = None
+        self._sender_thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+
+        self._sent = 0
+        self._dropped = 0
+        self._rate_limited = 0
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def sent(self) -> int:
+        return self._sent
 
-        self._session = requests.Session()
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    @property
+    def rate_limited(self) -> int:
+        return self._rate_limited
 
     def close(self):
-        self._session.close()
+        self._stop_event.set()
+
+        if self._sender_thread is not None and self._pid == os.getpid() and self._sender_thread.is_alive():
+            self._sender_thread.join(timeout=10)
+
+        if self._session is not None:
+            self._session.close()
 
     def send_tg(self, msg: str):
-        try:
-            utils.send_tg(self._session, self._bot_token, self._chat_id, msg, send_async=True)
-        except Exception:
-            traceback.print_exc()
-            pass
+        self._enqueue((msg, None, None))
 
     def send_tg_doc(self, caption: str, filename: str):
         try:
             with open(filename, "rb") as file:
                 file_content = file.read()
-
-            utils.send_document(self._session, self._bot_token, self._chat_id, file_content, filename, caption)
         except Exception:
             traceback.print_exc()
 
+            return
+
+        self._enqueue((caption, filename, file_content))
+
+    def _enqueue(self, item: tuple):
+        self._ensure_sender()
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._dropped += 1
+
+            logging.warning(f"Telegram backlog is full, message dropped ({self._dropped} dropped so far).")
+
+    def _ensure_sender(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._session = requests.Session()
+            self._queue = queue.Queue(maxsize=self._max_backlog)
+            self._sender_thread = threading.Thread(target=self._sender, daemon=True)
+            self._pid = os.getpid()
+
+            self._sender_thread.start()
+
+    def _sender(self):
+        pending = None
+
+        while True:
+            if pending is None:
+                try:
+                    pending = self._queue.get(timeout=1)
+                except queue.Empty:
+                    if self._stop_event.is_set():
+                        return
+
+                    continue
+
+            text, filename, file_content = pending
+
+            pending = None
+
+            try:
+                if filename is not None:
+                    self._send(lambda: utils.send_document(self._session, self._bot_token, self._chat_id,
+                                                           file_content, filename, text))
+
+                    continue
+
+                texts = [text]
+                length = len(text)
+
+                deadline = time.monotonic() + self._coalesce_delay_s
+
+                while length < self.MAX_MESSAGE_LENGTH:
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+
+                    if item[1] is not None or length + 2 + len(item[0]) > self.MAX_MESSAGE_LENGTH:
+                        pending = item
+
+                        break
+
+                    texts.append(item[0])
+                    length += 2 + len(item[0])
+
+                text = "\n\n".join(texts)
+
+                for i in range(0, len(text), self.MAX_MESSAGE_LENGTH):
+                    chunk = text[i:i + self.MAX_MESSAGE_LENGTH]
+
+                    self._send(lambda: utils.send_tg(self._session, self._bot_token, self._chat_id, chunk))
+            except Exception:
+                traceback.print_exc()
+
+    def _send(self, send):
+        for _ in range(self._max_retries):
+            response = send()
+
+            if response is None:
+                self._dropped += 1
+
+                return
+
+            if response.get("ok", False):
+                self._sent += 1
+
+                return
+
+            if response.get("error_code") != 429:
+                logging.error(f"Telegram error: {response}")
+
+                return
+
+            self._rate_limited += 1
+
+            retry_after = response.get("parameters", {}).get("retry_after", 1)
+
+            logging.warning(f"Telegram rate limit hit, retrying after {retry_after}s.")
+
+            time.sleep(retry_after)
+
+        logging.error(f"Telegram message dropped after {self._max_retries} rate limited attempts.")
+
+        self._dropped += 1
@@ -1,9 +1,10 @@
-import multiprocessing
 import requests
 import logging
 import urllib3
 import signal
 
+import ring_buffer
+import metrics
 import logger
 import server
 import bot
@@ -40,22 +41,51 @@ if __name__ == "__main__":
 
     signal.signal(signal.SIGINT, stop)
 
-    webhook_queue = multiprocessing.Queue()
+    webhook_queue = ring_buffer.RingBuffer(cfg.webhook_buffer_size)
 
-    tg_logger = logger.TgLogger(cfg.bot_token, cfg.chat_id)
+    webhook_metrics = metrics.Metrics()
 
-    bot = bot.Bot(cfg.account_name,
+    tg_logger = logger.TgLogger(cfg.bot_token, cfg.chat_id, cfg.tg_max_backlog, cfg.tg_coalesce_delay_s)
+
+    bot = bot.Bot(cfg.account_names,
                   cfg.tinkoff_token,
                   cfg.currency,
                   cfg.max_verify_attempts,
                   cfg.verify_delay_s,
                   cfg.min_money_coefficient,
                   cfg.tickers_filename,
+                  cfg.tickers_compact_interval_s,
+                  cfg.ticker_resolver_cache_size,
                   cfg.log_step_perc,
                   cfg.windows_str,
                   cfg.stats_hour,
+                  cfg.margin_store_dirname,
+                  cfg.margin_store_retention_s,
+                  cfg.client_pool_size,
+                  cfg.client_health_check_interval_s,
+                  cfg.client_keepalive_time_ms,
+                  cfg.instruments_snapshot_filename,
+                  cfg.instruments_snapshot_max_age_s,
+                  cfg.execution_engine,
+                  cfg.max_in_flight_orders,
+                  cfg.trades_stream_reconnect_delay_s,
+                  cfg.positions_stream_reconnect_delay_s,
+                  cfg.positions_reconcile_interval_s,
+                  cfg.last_price_max_age_s,
+                  cfg.market_data_stream_reconnect_delay_s,
+                  cfg.margin_reconcile_interval_s,
+                  cfg.margin_reconcile_after_fills,
+                  cfg.margin_max_age_s,
+                  cfg.stop_orders_reconcile_interval_s,
+                  cfg.stop_orders_max_workers,
+                  cfg.dedup_ttl_s,
+                  cfg.dedup_hash_ttl_s,
+                  cfg.dedup_max_entries,
+                  cfg.dedup_id_field,
+                  cfg.batch_max_workers,
                   tg_logger,
-                  webhook_queue)
+                  webhook_queue,
+                  webhook_metrics)
 
     bot.start()
 
@@ -63,6 +93,18 @@ if __name__ == "__main__":
                                       cfg.port,
                                       (cfg.cert_path, cfg.key_path),
                                       cfg.ip_whitelist,
-                                      webhook_queue)
+                                      cfg.metrics_ip_whitelist,
+                                      webhook_queue,
+                                      webhook_metrics,
+                                      server.IngressSettings(cfg.ingress_mode,
+                                                             cfg.ingress_workers,
+                                                             cfg.ingress_threads,
+                                                             cfg.ingress_keepalive_s,
+                                                             cfg.ingress_max_connections,
+                                                             cfg.ingress_backlog,
+                                                             cfg.ingress_drain_timeout_s),
+                                      cfg.liveness_check_interval_s,
+                                      cfg.heartbeat_timeout_s,
+                                      cfg.server_startup_timeout_s)
 
     wsm.start()
@@ -0,0 +1,132 @@
+from tinkoff.invest.utils import money_to_decimal
+from decimal import Decimal
+import threading
+import logging
+import time
+
+import client_pool
+
+
+class MarginEngine:
+    def __init__(self,
+                 client_pool: client_pool.ClientPool,
+                 reconcile_interval_s: float,
+                 reconcile_after_fills: int,
+                 max_age_s: float):
+        self._client_pool = client_pool
+        self._reconcile_interval_s = reconcile_interval_s
+        self._reconcile_after_fills = reconcile_after_fills
+        self._max_age_s = max_age_s
+
+        self._account_id = None
+
+        self._starting_margin: Decimal | None = None
+        self._liquid_portfolio: Decimal | None = None
+        self._pending_margin = Decimal(0)
+        self._fills_since_update = 0
+        self._updated_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self._reconcile_event = threading.Event()
+        self._stop_event = threading.Event()
+
+        self._reconciler_thread = threading.Thread(target=self._reconciler)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def is_fresh(self) -> bool:
+        with self._lock:
+            return self._starting_margin is not None and time.monotonic() - self._updated_at <= self._max_age_s
+
+    def start(self, account_id: str):
+        self._account_id = account_id
+
+        self._reconciler_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._reconcile_event.set()
+
+        if self._reconciler_thread.is_alive():
+            self._reconciler_thread.join()
+
+    def update(self, starting_margin: Decimal, liquid_portfolio: Decimal):
+        with self._lock:
+            self._starting_margin = starting_margin
+            self._liquid_portfolio = liquid_portfolio
+            self._fills_since_update = 0
+            self._updated_at = time.monotonic()
+            self._generation += 1
+
+    def reserve(self,
+                start_margin: Decimal,
+                min_money_coefficient: Decimal) -> tuple[Decimal, Decimal, bool] | None:
+        with self._lock:
+            if self._starting_margin is None or time.monotonic() - self._updated_at > self._max_age_s:
+                return None
+
+            account_start_margin = self._starting_margin + self._pending_margin
+
+            is_reserved = \
+                account_start_margin + start_margin <= self._liquid_portfolio * min_money_coefficient
+
+            if is_reserved:
+                self._pending_margin += start_margin
+
+            return account_start_margin, self._liquid_portfolio, is_reserved
+
+    def release(self, start_margin: Decimal):
+        with self._lock:
+            self._pending_margin -= start_margin
+
+    def commit(self, start_margin: Decimal, posted_generation: int):
+        with self._lock:
+            self._pending_margin -= start_margin
+
+            is_updated_since_posted = self._generation != posted_generation
+
+            if self._starting_margin is not None and not is_updated_since_posted:
+                self._starting_margin += start_margin
+
+        if is_updated_since_posted:
+            self._reconcile_event.set()
+
+        self._on_fill()
+
+    def request_reconcile(self):
+        self._reconcile_event.set()
+
+    def on_position_closed(self):
+        self._on_fill()
+
+        self._reconcile_event.set()
+
+    def _on_fill(self):
+        with self._lock:
+            self._fills_since_update += 1
+
+            fills_since_update = self._fills_since_update
+
+        if fills_since_update >= self._reconcile_after_fills:
+            self._reconcile_event.set()
+
+    def _refresh(self):
+        with self._client_pool.client() as client:
+            response = client.users.get_margin_attributes(account_id=self._account_id)
+
+        self.update(money_to_decimal(response.starting_margin), money_to_decimal(response.liquid_portfolio))
+
+    def _reconciler(self):
+        while not self._stop_event.is_set():
+            try:
+                self._refresh()
+            except Exception as ex:
+                logging.error(f"Error refreshing margin attributes: {ex.__class__.__name__} {ex}")
+
+            self._reconcile_event.wait(self._reconcile_interval_s)
+
+            self._reconcile_event.clear()
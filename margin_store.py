@@ -0,0 +1,198 @@
+from decimal import Decimal
+import pandas as pd
+import numpy as np
+import threading
+import json
+import os
+
+
+class MarginStore:
+    _COLUMNS = {"ts": "<i8", "ticker": "<i4", "value": "<f8"}
+
+    def __init__(self, directory: str, retention_s: float):
+        self._directory = directory
+        self._retention_s = retention_s
+
+        self._columns: dict[str, np.ndarray] = {name: np.empty(0, dtype=dtype) for name, dtype in self._COLUMNS.items()}
+        self._tickers: list[str] = []
+        self._ticker_indexes: dict[str, int] = {}
+        self._state: dict = {}
+
+        self._wide_ts = np.empty(0, dtype=self._COLUMNS["ts"])
+        self._wide = np.empty((0, 0), dtype=self._COLUMNS["value"])
+        self._wide_rows = 0
+        self._first = np.empty(0, dtype=self._COLUMNS["value"])
+        self._lock = threading.Lock()
+
+    def load(self):
+        os.makedirs(self._directory, exist_ok=True)
+
+        columns = {name: np.fromfile(self._path(name), dtype=dtype) if os.path.exists(self._path(name))
+                   else np.empty(0, dtype=dtype) for name, dtype in self._COLUMNS.items()}
+
+        size = min(len(column) for column in columns.values())
+
+        self._columns = {name: column[:size] for name, column in columns.items()}
+
+        try:
+            with open(self._path("tickers.txt"), "r", encoding="utf-8") as f:
+                self._tickers = f.read().splitlines()
+        except FileNotFoundError:
+            self._tickers = []
+
+        self._ticker_indexes = {ticker: i for i, ticker in enumerate(self._tickers)}
+
+        try:
+            with open(self._path("state.json"), "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+        except FileNotFoundError:
+            self._state = {}
+
+        with self._lock:
+            self._rebuild_wide()
+
+        self.compact(self._columns["ts"][-1] if size else 0)
+
+    @property
+    def samples_count(self) -> int:
+        return len(self._columns["ts"])
+
+    def get_state(self, key: str, default=None):
+        return self._state.get(key, default)
+
+    def set_state(self, key: str, value):
+        self._state[key] = value
+
+        tmp_path = self._path("state.json.tmp")
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+
+        os.replace(tmp_path, self._path("state.json"))
+
+    def append(self, ts: float, values: dict[str, Decimal]):
+        if not values:
+            return
+
+        with self._lock:
+            new_tickers = [ticker for ticker in values if ticker not in self._ticker_indexes]
+
+            if new_tickers:
+                with open(self._path("tickers.txt"), "a", encoding="utf-8") as f:
+                    for ticker in new_tickers:
+                        self._ticker_indexes[ticker] = len(self._tickers)
+                        self._tickers.append(ticker)
+
+                        f.write(f"{ticker}\n")
+
+            columns = {
+                "ts": np.full(len(values), int(ts), dtype=self._COLUMNS["ts"]),
+                "ticker": np.fromiter((self._ticker_indexes[ticker] for ticker in values),
+                                      dtype=self._COLUMNS["ticker"], count=len(values)),
+                "value": np.fromiter((float(value) for value in values.values()), dtype=self._COLUMNS["value"],
+                                     count=len(values)),
+            }
+
+            for name, column in columns.items():
+                with open(self._path(name), "ab") as f:
+                    column.tofile(f)
+
+                self._columns[name] = np.concatenate((self._columns[name], column))
+
+            self._append_wide(columns)
+
+    def compact(self, now_ts: float):
+        with self._lock:
+            keep = self._columns["ts"] >= now_ts - self._retention_s
+
+            if keep.all():
+                return
+
+            for name in self._COLUMNS:
+                self._columns[name] = self._columns[name][keep]
+
+                tmp_path = self._path(f"{name}.tmp")
+
+                self._columns[name].tofile(tmp_path)
+
+                os.replace(tmp_path, self._path(name))
+
+            self._rebuild_wide()
+
+    def latest(self, tickers) -> pd.Series:
+        with self._lock:
+            if not self._wide_rows:
+                return pd.Series(dtype="float64")
+
+            values = pd.Series(self._wide[self._wide_rows - 1], index=self._tickers)
+
+        return values.reindex(list(tickers)).dropna()
+
+    def asof(self, ts: float, tickers) -> pd.Series:
+        with self._lock:
+            if not self._wide_rows:
+                return pd.Series(dtype="float64")
+
+            row = np.searchsorted(self._wide_ts[:self._wide_rows], ts, side="right") - 1
+
+            values = self._first if row < 0 else np.where(np.isnan(self._wide[row]), self._first, self._wide[row])
+
+            values = pd.Series(values, index=self._tickers)
+
+        return values.reindex(list(tickers)).dropna()
+
+    def deltas(self, now_ts: float, windows: dict[str, float], tickers) -> pd.DataFrame:
+        curr = self.latest(tickers)
+
+        stats = pd.DataFrame({"curr": curr})
+
+        for name, window_s in windows.items():
+            base = self.asof(now_ts - window_s, curr.index)
+
+            stats[f"prev_{name}"] = base
+            stats[name] = (curr - base) / base * 100
+
+        return stats
+
+    def _rebuild_wide(self):
+        wide_ts, rows = np.unique(self._columns["ts"], return_inverse=True)
+
+        wide = np.full((len(wide_ts), len(self._tickers)), np.nan, dtype=self._COLUMNS["value"])
+        wide[rows, self._columns["ticker"]] = self._columns["value"]
+
+        has_value = ~np.isnan(wide)
+
+        self._first = np.where(has_value.any(axis=0), wide[has_value.argmax(axis=0), np.arange(wide.shape[1])],
+                               np.nan) if len(wide_ts) else np.full(len(self._tickers), np.nan)
+
+        self._wide_ts = wide_ts
+        self._wide = pd.DataFrame(wide).ffill().to_numpy()
+        self._wide_rows = len(wide_ts)
+
+    def _append_wide(self, columns: dict[str, np.ndarray]):
+        ts = columns["ts"][0]
+
+        if len(self._tickers) > self._wide.shape[1]:
+            extra = len(self._tickers) - self._wide.shape[1]
+
+            self._wide = np.pad(self._wide, ((0, 0), (0, extra)), constant_values=np.nan)
+            self._first = np.pad(self._first, (0, extra), constant_values=np.nan)
+
+        if not self._wide_rows or self._wide_ts[self._wide_rows - 1] != ts:
+            if self._wide_rows == len(self._wide_ts):
+                capacity = max(self._wide_rows * 2, 64)
+
+                self._wide_ts = np.resize(self._wide_ts, capacity)
+                self._wide = np.pad(self._wide, ((0, capacity - self._wide.shape[0]), (0, 0)),
+                                    constant_values=np.nan)
+
+            self._wide[self._wide_rows] = self._wide[self._wide_rows - 1] if self._wide_rows else np.nan
+            self._wide_ts[self._wide_rows] = ts
+            self._wide_rows += 1
+
+        self._wide[self._wide_rows - 1, columns["ticker"]] = columns["value"]
+
+        self._first = np.where(np.isnan(self._first), self._wide[self._wide_rows - 1], self._first)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
@@ -0,0 +1,274 @@
+import multiprocessing
+import threading
+import logging
+import bisect
+import time
+import os
+
+import utils
+
+SHARDS_COUNT = 32
+
+STAGE_BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGES = ("ingress", "queue", "batch_prefetch", "resolve", "balance", "price", "margin", "post_order", "wait_status",
+          "cancel_stop_orders", "stop_orders", "total", "other")
+
+RPC_METHODS = ("get_accounts", "get_info", "get_margin_attributes", "futures", "shares", "etfs", "get_last_prices",
+               "get_positions", "post_order", "get_order_state", "post_stop_order", "get_stop_orders",
+               "cancel_stop_order", "other")
+
+WEBHOOK_RESULTS = ("accepted", "rejected", "forbidden")
+
+SIGNAL_RESULTS = ("ok", "error", "deferred", "duplicate", "decode_error", "other")
+
+GAUGES = ("deferred_pending", "tg_backlog", "execution_lanes", "dedup_entries")
+
+
+class UnknownLabelException(Exception):
+    pass
+
+
+def _get_index(indexes: dict[str, int], name: str, label_value: str) -> int:
+    index = indexes.get(label_value, indexes.get("other"))
+
+    if index is None:
+        raise UnknownLabelException(f"Unknown label value for {name}: {label_value}!")
+
+    return index
+
+
+class _Shards:
+    def __init__(self):
+        self._owners = multiprocessing.RawArray("q", SHARDS_COUNT)
+        self._claim_lock = utils.RecoverableLock("Metrics shards")
+
+        self._pid = None
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        state["_pid"] = None
+        state["_lock"] = None
+
+        return state
+
+    def get(self) -> tuple[int, threading.Lock]:
+        pid = os.getpid()
+
+        if self._pid != pid:
+            self._claim(pid)
+
+        return self._index, self._lock
+
+    def _claim(self, pid: int):
+        with self._claim_lock:
+            if self._pid == pid:
+                return
+
+            index = next((i for i, owner in enumerate(self._owners)
+                          if owner in (0, pid) or not utils.is_process_alive(owner)), None)
+
+            if index is None:
+                index = pid % SHARDS_COUNT
+
+                logging.warning(f"No free metrics shard for process {pid}, sharing shard #{index}.")
+
+            self._owners[index] = pid
+
+            self._index = index
+            self._lock = threading.Lock()
+            self._pid = pid
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Counter:
+    def __init__(self,
+                 name: str,
+                 help_text: str,
+                 label_name: str,
+                 label_values: tuple[str, ...],
+                 shards: _Shards):
+        self._name = name
+        self._help_text = help_text
+        self._label_name = label_name
+        self._label_values = label_values
+        self._indexes = {value: i for i, value in enumerate(label_values)}
+        self._shards = shards
+
+        self._values = multiprocessing.RawArray("Q", SHARDS_COUNT * len(label_values))
+
+    def inc(self, label_value: str, amount: int = 1):
+        index = _get_index(self._indexes, self._name, label_value)
+
+        shard, lock = self._shards.get()
+
+        with lock:
+            self._values[shard * len(self._label_values) + index] += amount
+
+    def get(self, label_value: str) -> int:
+        return self._sum(self._indexes[label_value])
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self._name} {self._help_text}", f"# TYPE {self._name} counter"]
+
+        for i, label_value in enumerate(self._label_values):
+            lines.append(f"{self._name}{_format_labels({self._label_name: label_value})} {self._sum(i)}")
+
+        return lines
+
+    def _sum(self, index: int) -> int:
+        return sum(self._values[index::len(self._label_values)])
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, label_name: str, label_values: tuple[str, ...]):
+        self._name = name
+        self._help_text = help_text
+        self._label_name = label_name
+        self._label_values = label_values
+        self._indexes = {value: i for i, value in enumerate(label_values)}
+
+        self._values = multiprocessing.RawArray("d", len(label_values))
+
+    def set(self, label_value: str, value: float):
+        self._values[_get_index(self._indexes, self._name, label_value)] = value
+
+    def render(self, extra: dict[str, float] | None = None) -> list[str]:
+        lines = [f"# HELP {self._name} {self._help_text}", f"# TYPE {self._name} gauge"]
+
+        values = {label_value: self._values[i] for i, label_value in enumerate(self._label_values)}
+        values.update(extra or {})
+
+        for label_value, value in values.items():
+            lines.append(f"{self._name}{_format_labels({self._label_name: label_value})} {value:g}")
+
+        return lines
+
+
+class Histogram:
+    def __init__(self,
+                 name: str,
+                 help_text: str,
+                 label_name: str,
+                 label_values: tuple[str, ...],
+                 buckets: tuple[float, ...],
+                 shards: _Shards):
+        self._name = name
+        self._help_text = help_text
+        self._label_name = label_name
+        self._label_values = label_values
+        self._indexes = {value: i for i, value in enumerate(label_values)}
+        self._buckets = buckets
+        self._shards = shards
+
+        self._counts = multiprocessing.RawArray("Q", SHARDS_COUNT * len(label_values) * (len(buckets) + 1))
+        self._sums = multiprocessing.RawArray("d", SHARDS_COUNT * len(label_values))
+
+    def observe(self, label_value: str, value: float):
+        index = _get_index(self._indexes, self._name, label_value)
+        bucket = bisect.bisect_left(self._buckets, value)
+
+        shard, lock = self._shards.get()
+
+        index += shard * len(self._label_values)
+
+        with lock:
+            self._counts[index * (len(self._buckets) + 1) + bucket] += 1
+            self._sums[index] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self._name} {self._help_text}", f"# TYPE {self._name} histogram"]
+
+        row_size = len(self._buckets) + 1
+
+        for i, label_value in enumerate(self._label_values):
+            counts = [0] * row_size
+            total = 0.0
+
+            for shard in range(SHARDS_COUNT):
+                index = shard * len(self._label_values) + i
+
+                for bucket, count in enumerate(self._counts[index * row_size:(index + 1) * row_size]):
+                    counts[bucket] += count
+
+                total += self._sums[index]
+
+            cumulative = 0
+
+            for bound, count in zip(self._buckets + (float("inf"),), counts):
+                cumulative += count
+
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+
+                lines.append(f"{self._name}_bucket{_format_labels({self._label_name: label_value, 'le': le})} "
+                             f"{cumulative}")
+
+            lines.append(f"{self._name}_sum{_format_labels({self._label_name: label_value})} {total:g}")
+            lines.append(f"{self._name}_count{_format_labels({self._label_name: label_value})} {cumulative}")
+
+        return lines
+
+
+class StageTimer:
+    def __init__(self, metrics: "Metrics", started_at: float | None = None):
+        self._metrics = metrics
+        self._started_at = started_at if started_at is not None else time.perf_counter()
+        self._marked_at = self._started_at
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+
+        self._metrics.stage_seconds.observe(stage, now - self._marked_at)
+
+        self._marked_at = now
+
+    def finish(self):
+        self._metrics.stage_seconds.observe("total", time.perf_counter() - self._started_at)
+
+
+class Metrics:
+    PREFIX = "tinkoff_connector"
+
+    def __init__(self):
+        shards = _Shards()
+
+        self.stage_seconds = Histogram(f"{self.PREFIX}_stage_seconds",
+                                       "Time spent in each stage of webhook handling.",
+                                       "stage", STAGES, STAGE_BUCKETS_S, shards)
+        self.rpc_seconds = Histogram(f"{self.PREFIX}_rpc_seconds",
+                                     "Broker RPC latency per method.",
+                                     "method", RPC_METHODS, STAGE_BUCKETS_S, shards)
+        self.rpc_errors = Counter(f"{self.PREFIX}_rpc_errors_total",
+                                  "Broker RPC errors per method.",
+                                  "method", RPC_METHODS, shards)
+        self.webhooks = Counter(f"{self.PREFIX}_webhooks_total",
+                                "Webhook requests handled by the ingress.",
+                                "result", WEBHOOK_RESULTS, shards)
+        self.signals = Counter(f"{self.PREFIX}_signals_total",
+                               "Signals handled by the bot.",
+                               "result", SIGNAL_RESULTS, shards)
+        self.gauges = Gauge(f"{self.PREFIX}_state",
+                            "Current queue and backlog sizes.",
+                            "name", GAUGES)
+
+    def stage_timer(self, started_at: float | None = None) -> StageTimer:
+        return StageTimer(self, started_at)
+
+    def render(self, extra_gauges: dict[str, float] | None = None) -> str:
+        lines = []
+
+        for metric in (self.stage_seconds, self.rpc_seconds, self.rpc_errors, self.webhooks, self.signals):
+            lines.extend(metric.render())
+
+        lines.extend(self.gauges.render(extra_gauges))
+
+        return "\n".join(lines) + "\n"
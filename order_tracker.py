@@ -0,0 +1,117 @@
+from concurrent.futures import Future
+import threading
+import logging
+import time
+
+import client_pool
+
+
+class OrderStreamDownException(Exception):
+    pass
+
+
+class OrderTracker:
+    def __init__(self, client_pool: client_pool.ClientPool, reconnect_delay_s: float, pending_event_ttl_s: float):
+        self._client_pool = client_pool
+        self._reconnect_delay_s = reconnect_delay_s
+        self._pending_event_ttl_s = pending_event_ttl_s
+
+        self._account_id = None
+
+        self._waiters: dict[str, Future] = {}
+        self._pending_events: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self._is_streaming = False
+
+        self._stop_event = threading.Event()
+
+        self._stream_reader_thread = threading.Thread(target=self._stream_reader, daemon=True)
+
+    @property
+    def is_streaming(self) -> bool:
+        return self._is_streaming
+
+    def start(self, account_id: str):
+        self._account_id = account_id
+
+        self._stream_reader_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+        self._set_streaming(False)
+
+        if self._stream_reader_thread.is_alive():
+            self._stream_reader_thread.join(timeout=1)
+
+    def register(self, order_id: str) -> Future:
+        future = Future()
+
+        with self._lock:
+            if not self._is_streaming:
+                future.set_exception(OrderStreamDownException("Trades stream is down!"))
+            elif self._pending_events.pop(order_id, None) is not None:
+                future.set_result(order_id)
+            else:
+                self._waiters[order_id] = future
+
+        return future
+
+    def discard(self, order_id: str):
+        with self._lock:
+            self._waiters.pop(order_id, None)
+            self._pending_events.pop(order_id, None)
+
+    def _on_order_event(self, order_id: str):
+        with self._lock:
+            future = self._waiters.pop(order_id, None)
+
+            if future is None:
+                self._pending_events[order_id] = time.monotonic()
+
+        if future is not None:
+            future.set_result(order_id)
+
+    def _purge_pending_events(self):
+        expire_before = time.monotonic() - self._pending_event_ttl_s
+
+        with self._lock:
+            for order_id in [k for k, v in self._pending_events.items() if v < expire_before]:
+                del self._pending_events[order_id]
+
+    def _set_streaming(self, is_streaming: bool):
+        with self._lock:
+            self._is_streaming = is_streaming
+
+            waiters = [] if is_streaming else list(self._waiters.values())
+
+            if not is_streaming:
+                self._waiters.clear()
+
+        for future in waiters:
+            future.set_exception(OrderStreamDownException("Trades stream is down!"))
+
+    def _stream_reader(self):
+        while not self._stop_event.is_set():
+            try:
+                with self._client_pool.client() as client:
+                    self._set_streaming(True)
+
+                    logging.info("Trades stream subscribed.")
+
+                    for response in client.orders_stream.trades_stream(accounts=[self._account_id]):
+                        if self._stop_event.is_set():
+                            break
+
+                        if response.order_trades is not None and response.order_trades.order_id:
+                            self._on_order_event(response.order_trades.order_id)
+
+                        self._purge_pending_events()
+            except Exception as ex:
+                if not self._stop_event.is_set():
+                    logging.error(f"Trades stream error: {ex.__class__.__name__} {ex}")
+            finally:
+                self._set_streaming(False)
+
+            self._stop_event.wait(self._reconnect_delay_s)
@@ -0,0 +1,155 @@
+import threading
+import logging
+import time
+
+import client_pool
+import logger
+
+
+class PositionBook:
+    def __init__(self,
+                 client_pool: client_pool.ClientPool,
+                 reconcile_interval_s: float,
+                 reconnect_delay_s: float,
+                 tg_logger: logger.TgLogger):
+        self._client_pool = client_pool
+        self._reconcile_interval_s = reconcile_interval_s
+        self._reconnect_delay_s = reconnect_delay_s
+        self._tg_logger = tg_logger
+
+        self._account_id = None
+
+        self._balances: dict[str, int] = {}
+        self._updated_at: dict[str, float] = {}
+        self._dirty: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self._is_synced = False
+
+        self._stop_event = threading.Event()
+
+        self._stream_reader_thread = threading.Thread(target=self._stream_reader, daemon=True)
+
+        self._reconciler_thread = threading.Thread(target=self._reconciler)
+
+    @property
+    def is_synced(self) -> bool:
+        return self._is_synced
+
+    def start(self, account_id: str):
+        self._account_id = account_id
+
+        self._stream_reader_thread.start()
+
+        self._reconciler_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+        self._is_synced = False
+
+        if self._reconciler_thread.is_alive():
+            self._reconciler_thread.join()
+
+        if self._stream_reader_thread.is_alive():
+            self._stream_reader_thread.join(timeout=1)
+
+    def get_balance(self, uid: str) -> int | None:
+        if not self._is_synced or uid in self._dirty:
+            return None
+
+        return self._balances.get(uid, 0)
+
+    def mark_dirty(self, uid: str):
+        with self._lock:
+            self._dirty[uid] = time.monotonic()
+
+    def _snapshot(self) -> dict[str, int]:
+        with self._client_pool.client() as client:
+            positions = client.operations.get_positions(account_id=self._account_id)
+
+        return {position.instrument_uid: position.balance for position in positions.securities + positions.futures}
+
+    def _apply(self, balances: dict[str, int], since: float) -> dict[str, tuple[int, int]]:
+        drift = {}
+
+        with self._lock:
+            for uid in set(self._balances) | set(balances):
+                if self._updated_at.get(uid, 0) > since:
+                    continue
+
+                prev_balance = self._balances.get(uid, 0)
+                balance = balances.get(uid, 0)
+
+                if prev_balance != balance:
+                    drift[uid] = (prev_balance, balance)
+
+                if balance == 0:
+                    self._balances.pop(uid, None)
+                else:
+                    self._balances[uid] = balance
+
+            self._dirty = {uid: marked_at for uid, marked_at in self._dirty.items()
+                           if marked_at > since - self._reconcile_interval_s}
+
+        return drift
+
+    def _on_position_data(self, position_data):
+        now = time.monotonic()
+
+        with self._lock:
+            for position in position_data.securities + position_data.futures:
+                if position.balance == 0:
+                    self._balances.pop(position.instrument_uid, None)
+                else:
+                    self._balances[position.instrument_uid] = position.balance
+
+                self._updated_at[position.instrument_uid] = now
+
+                self._dirty.pop(position.instrument_uid, None)
+
+    def _stream_reader(self):
+        while not self._stop_event.is_set():
+            try:
+                with self._client_pool.client() as client:
+                    subscribed_at = time.monotonic()
+
+                    for response in client.operations_stream.positions_stream(accounts=[self._account_id]):
+                        if self._stop_event.is_set():
+                            break
+
+                        if not self._is_synced:
+                            self._apply(self._snapshot(), subscribed_at)
+
+                            self._is_synced = True
+
+                            logging.info(f"Position book synced: {len(self._balances)} positions.")
+
+                        if response.position is not None:
+                            self._on_position_data(response.position)
+            except Exception as ex:
+                if not self._stop_event.is_set():
+                    logging.error(f"Positions stream error: {ex.__class__.__name__} {ex}")
+            finally:
+                self._is_synced = False
+
+            self._stop_event.wait(self._reconnect_delay_s)
+
+    def _reconciler(self):
+        while not self._stop_event.wait(self._reconcile_interval_s):
+            if not self._is_synced:
+                continue
+
+            try:
+                st = time.monotonic()
+
+                drift = self._apply(self._snapshot(), st)
+            except Exception as ex:
+                logging.error(f"Error reconciling position book: {ex.__class__.__name__} {ex}")
+
+                continue
+
+            if drift:
+                self._tg_logger.send_tg(
+                    "⚠️ Position book drift corrected:\n" +
+                    "\n".join(f"{uid}: {prev_balance} -> {balance}" for uid, (prev_balance, balance) in drift.items()))
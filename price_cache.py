@@ -0,0 +1,120 @@
+from tinkoff.invest import MarketDataRequest, SubscribeLastPriceRequest, SubscriptionAction, LastPriceInstrument
+from tinkoff.invest.utils import quotation_to_decimal
+from typing import Callable
+from decimal import Decimal
+import threading
+import logging
+import queue
+import time
+
+import client_pool
+
+
+class LastPriceCache:
+    def __init__(self,
+                 client_pool: client_pool.ClientPool,
+                 tracked_uids_getter: Callable[[], set[str]],
+                 refresh_interval_s: float,
+                 reconnect_delay_s: float):
+        self._client_pool = client_pool
+        self._tracked_uids_getter = tracked_uids_getter
+        self._refresh_interval_s = refresh_interval_s
+        self._reconnect_delay_s = reconnect_delay_s
+
+        self._prices: dict[str, tuple[Decimal, float]] = {}
+
+        self._subscribed_uids: set[str] = set()
+        self._requests: queue.Queue | None = None
+        self._subscriptions_lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+
+        self._stream_reader_thread = threading.Thread(target=self._stream_reader, daemon=True)
+
+        self._subscriber_thread = threading.Thread(target=self._subscriber)
+
+    def start(self):
+        self._stream_reader_thread.start()
+
+        self._subscriber_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+        if self._subscriber_thread.is_alive():
+            self._subscriber_thread.join()
+
+        if self._stream_reader_thread.is_alive():
+            self._stream_reader_thread.join(timeout=1)
+
+    def get(self, uid: str, max_age_s: float) -> Decimal | None:
+        item = self._prices.get(uid)
+
+        if item is None or time.monotonic() - item[1] > max_age_s:
+            return None
+
+        return item[0]
+
+    def put(self, uid: str, price: Decimal):
+        self._prices[uid] = (price, time.monotonic())
+
+    def _subscribe(self, uids: set[str]):
+        with self._subscriptions_lock:
+            uids = uids - self._subscribed_uids
+
+            if self._requests is None or not uids:
+                return
+
+            self._requests.put(MarketDataRequest(subscribe_last_price_request=SubscribeLastPriceRequest(
+                subscription_action=SubscriptionAction.SUBSCRIPTION_ACTION_SUBSCRIBE,
+                instruments=[LastPriceInstrument(instrument_id=uid) for uid in uids])))
+
+            self._subscribed_uids |= uids
+
+        logging.info(f"Last price cache subscribed to {len(uids)} instrument(s).")
+
+    def _subscriber(self):
+        while not self._stop_event.is_set():
+            try:
+                self._subscribe(self._tracked_uids_getter())
+            except Exception as ex:
+                logging.error(f"Error updating last price subscriptions: {ex.__class__.__name__} {ex}")
+
+            self._stop_event.wait(self._refresh_interval_s)
+
+    def _request_iterator(self, requests: queue.Queue):
+        while not self._stop_event.is_set():
+            try:
+                yield requests.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _stream_reader(self):
+        while not self._stop_event.is_set():
+            requests = queue.Queue()
+
+            with self._subscriptions_lock:
+                self._subscribed_uids = set()
+                self._requests = requests
+
+            try:
+                self._subscribe(self._tracked_uids_getter())
+
+                with self._client_pool.client() as client:
+                    for response in client.market_data_stream.market_data_stream(self._request_iterator(requests)):
+                        if self._stop_event.is_set():
+                            break
+
+                        last_price = response.last_price
+
+                        if last_price is not None and last_price.instrument_uid:
+                            self._prices[last_price.instrument_uid] = \
+                                (quotation_to_decimal(last_price.price), time.monotonic())
+            except Exception as ex:
+                if not self._stop_event.is_set():
+                    logging.error(f"Market data stream error: {ex.__class__.__name__} {ex}")
+            finally:
+                with self._subscriptions_lock:
+                    self._requests = None
+
+            self._stop_event.wait(self._reconnect_delay_s)
@@ -0,0 +1,113 @@
+import multiprocessing
+import struct
+import queue
+import time
+
+import utils
+
+_HEADER = struct.Struct("<Id")
+
+
+class RingBuffer:
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+
+        self._buffer = multiprocessing.RawArray("B", capacity)
+        self._head = multiprocessing.RawValue("Q", 0)
+        self._tail = multiprocessing.RawValue("Q", 0)
+        self._count = multiprocessing.RawValue("Q", 0)
+        self._dropped = multiprocessing.RawValue("Q", 0)
+        self._lock = utils.RecoverableLock("Ring buffer")
+        self._items = multiprocessing.Semaphore(0)
+
+        self._view = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        state["_view"] = None
+
+        return state
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def used(self) -> int:
+        return self._head.value - self._tail.value
+
+    @property
+    def count(self) -> int:
+        return self._count.value
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped.value
+
+    def put(self, data: bytes) -> bool:
+        size = _HEADER.size + len(data)
+
+        with self._lock:
+            if self._head.value - self._tail.value + size > self._capacity:
+                self._dropped.value += 1
+
+                return False
+
+            self._write(self._head.value, _HEADER.pack(len(data), time.monotonic()))
+            self._write(self._head.value + _HEADER.size, data)
+
+            self._head.value += size
+            self._count.value += 1
+
+        self._items.release()
+
+        return True
+
+    def get(self, timeout: float | None = None) -> bytes:
+        return self.get_entry(timeout)[0]
+
+    def get_entry(self, timeout: float | None = None) -> tuple[bytes, float]:
+        # The semaphore is only a wake-up hint: a writer killed after publishing an entry never releases it.
+        self._items.acquire(timeout=timeout)
+
+        with self._lock:
+            if self._head.value == self._tail.value:
+                raise queue.Empty
+
+            length, enqueued_at = _HEADER.unpack(self._read(self._tail.value, _HEADER.size))
+
+            data = self._read(self._tail.value + _HEADER.size, length)
+
+            self._tail.value += _HEADER.size + length
+            self._count.value = max(self._count.value - 1, 0)
+
+        return data, enqueued_at
+
+    def _get_view(self) -> memoryview:
+        if self._view is None:
+            self._view = memoryview(self._buffer).cast("B")
+
+        return self._view
+
+    def _write(self, position: int, data: bytes):
+        view = self._get_view()
+
+        start = position % self._capacity
+        first = min(len(data), self._capacity - start)
+
+        view[start:start + first] = data[:first]
+
+        if first < len(data):
+            view[:len(data) - first] = data[first:]
+
+    def _read(self, position: int, length: int) -> bytes:
+        view = self._get_view()
+
+        start = position % self._capacity
+        first = min(length, self._capacity - start)
+
+        if first == length:
+            return bytes(view[start:start + length])
+
+        return bytes(view[start:start + first]) + bytes(view[:length - first])
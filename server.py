@@ -1,75 +1,225 @@
-from flask import Flask, request
+from gunicorn.app.base import BaseApplication
+from werkzeug.serving import make_server
+from flask import Flask, Response, request, g
+import multiprocessing.connection
 import multiprocessing
 import threading
 import traceback
-import requests
 import logging
 import typing
-import queue
-import json
+import signal
+import socket
 import time
 
+import ring_buffer
+import metrics
 import logger
+import utils
 import cfg
 
 
+class IngressMode(utils.BaseEnum):
+    FLASK = "flask"
+    GUNICORN = "gunicorn"
+
+
+class IngressSettings(typing.NamedTuple):
+    mode: str
+    workers: int
+    threads: int
+    keepalive_s: int
+    max_connections: int
+    backlog: int
+    drain_timeout_s: float
+
+
+class _GunicornApplication(BaseApplication):
+    def __init__(self, app: Flask, options: dict):
+        self._app = app
+        self._options = options
+
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self._options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self._app
+
+
 class WebhookServer:
     def __init__(self,
                  ip: str,
                  port: int,
                  ssl_context: typing.Tuple[str, str],
                  ip_whitelist: list[str],
-                 webhook_queue: queue.Queue):
+                 metrics_ip_whitelist: list[str],
+                 webhook_queue: ring_buffer.RingBuffer,
+                 webhook_metrics: metrics.Metrics,
+                 ingress_settings: IngressSettings,
+                 ready_event: multiprocessing.Event,
+                 heartbeat: multiprocessing.Value):
         self._ip = ip
         self._port = port
         self._ssl_context = ssl_context
         self._ip_whitelist = ip_whitelist
+        self._metrics_ip_whitelist = metrics_ip_whitelist
         self._webhook_queue = webhook_queue
-        self._tg_logger = logger.TgLogger(cfg.bot_token, cfg.chat_id)
+        self._metrics = webhook_metrics
+        self._ingress_settings = ingress_settings
+        self._ready_event = ready_event
+        self._heartbeat = heartbeat
+        self._tg_logger = logger.TgLogger(cfg.bot_token, cfg.chat_id, cfg.tg_max_backlog, cfg.tg_coalesce_delay_s)
 
         self._ip_whitelist.append(self._ip)
 
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
         self._app = Flask(__name__)
 
+        @self._app.before_request
+        def track_request_start():
+            g.started_at = time.perf_counter()
+
+            with self._in_flight_lock:
+                self._in_flight += 1
+
+        @self._app.teardown_request
+        def track_request_end(_ex):
+            with self._in_flight_lock:
+                self._in_flight -= 1
+
         @self._app.before_request
         def limit_remote_addr():
-            if request.remote_addr not in ip_whitelist:
+            if request.remote_addr not in (metrics_ip_whitelist if request.path == "/metrics" else ip_whitelist):
+                webhook_metrics.webhooks.inc("forbidden")
+
                 return "Access denied", 403
 
         @self._app.route("/webhook", methods=["POST"])
         def webhook():
-            data = request.get_data().decode("utf-8")
+            data = request.get_data()
+
+            if not webhook_queue.put(data):
+                webhook_metrics.webhooks.inc("rejected")
+
+                self._tg_logger.send_tg(f"❌ Webhook queue is full: "
+                                        f"{webhook_queue.used}/{webhook_queue.capacity} bytes, "
+                                        f"{webhook_queue.count} pending, {webhook_queue.dropped} dropped.\n"
+                                        f"Webhook: {data}.")
+
+                return "Queue full", 503
 
-            try:
-                webhook_queue.put(json.loads(data))
-            except Exception as ex:
-                traceback.print_exc()
+            webhook_metrics.webhooks.inc("accepted")
+            webhook_metrics.stage_seconds.observe("ingress", time.perf_counter() - g.started_at)
 
-                self._tg_logger.send_tg(f"❌ Error occurred while decoding webhook: {ex.__class__.__name__} {ex}.\n"
-                                        f"Webhook: {request.get_data()}.\n"
-                                        f"Decoded webhook str: \n{data}")
             return ""
 
+        @self._app.route("/metrics", methods=["GET"])
+        def metrics_endpoint():
+            return Response(webhook_metrics.render({"queue_count": webhook_queue.count,
+                                                    "queue_bytes": webhook_queue.used,
+                                                    "queue_capacity_bytes": webhook_queue.capacity,
+                                                    "queue_dropped": webhook_queue.dropped}),
+                            mimetype="text/plain; version=0.0.4")
+
         @self._app.route("/ping", methods=["GET", "POST"])
         def ping():
             return "pong"
 
     def _run(self):
-        self._app.run(host=self._ip,
-                      port=self._port,
-                      ssl_context=self._ssl_context)
+        if IngressMode.value_of(self._ingress_settings.mode) == IngressMode.GUNICORN:
+            self._run_gunicorn()
+        else:
+            self._run_werkzeug()
+
+    def _beat(self):
+        self._heartbeat.value += 1
+
+    def _beat_from_worker(self, worker):
+        notify = worker.notify
+
+        def beat_and_notify():
+            self._beat()
+
+            notify()
+
+        worker.notify = beat_and_notify
+
+    def _run_werkzeug(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self._ip, self._port))
+        sock.listen(self._ingress_settings.backlog)
+
+        srv = make_server(self._ip,
+                          self._port,
+                          self._app,
+                          threaded=True,
+                          ssl_context=self._ssl_context,
+                          fd=sock.fileno())
+
+        srv.service_actions = self._beat
+
+        signal.signal(signal.SIGTERM, lambda _signal, _frame: threading.Thread(target=srv.shutdown).start())
+
+        self._ready_event.set()
+
+        srv.serve_forever(poll_interval=0.1)
+
+        srv.server_close()
+        sock.close()
+
+        deadline = time.monotonic() + self._ingress_settings.drain_timeout_s
+
+        while self._in_flight > 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _run_gunicorn(self):
+        cert_path, key_path = self._ssl_context
+
+        _GunicornApplication(self._app, {
+            "bind": f"{self._ip}:{self._port}",
+            "worker_class": "gthread",
+            "workers": self._ingress_settings.workers,
+            "threads": self._ingress_settings.threads,
+            "worker_connections": self._ingress_settings.max_connections,
+            "keepalive": self._ingress_settings.keepalive_s,
+            "backlog": self._ingress_settings.backlog,
+            "certfile": cert_path,
+            "keyfile": key_path,
+            "timeout": 30,
+            "graceful_timeout": self._ingress_settings.drain_timeout_s,
+            "reuse_port": True,
+            "accesslog": None,
+            "when_ready": lambda _arbiter: self._ready_event.set(),
+            "post_worker_init": self._beat_from_worker,
+        }).run()
 
     @staticmethod
     def run_flask(ip: str,
                   port: int,
                   ssl_context: typing.Tuple[str, str],
                   ip_whitelist: list[str],
-                  webhook_queue: queue.Queue):
+                  metrics_ip_whitelist: list[str],
+                  webhook_queue: ring_buffer.RingBuffer,
+                  webhook_metrics: metrics.Metrics,
+                  ingress_settings: IngressSettings,
+                  ready_event: multiprocessing.Event,
+                  heartbeat: multiprocessing.Value):
         webhook_server = WebhookServer(ip,
                                        port,
                                        ssl_context,
                                        ip_whitelist,
-                                       webhook_queue)
+                                       metrics_ip_whitelist,
+                                       webhook_queue,
+                                       webhook_metrics,
+                                       ingress_settings,
+                                       ready_event,
+                                       heartbeat)
 
         webhook_server._run()
 
@@ -80,24 +230,51 @@ class WebhookServerManager:
                  port: int,
                  ssl_context: typing.Tuple[str, str],
                  ip_whitelist: list[str],
-                 webhook_queue: queue.Queue):
+                 metrics_ip_whitelist: list[str],
+                 webhook_queue: ring_buffer.RingBuffer,
+                 webhook_metrics: metrics.Metrics,
+                 ingress_settings: IngressSettings,
+                 liveness_check_interval_s: float,
+                 heartbeat_timeout_s: float,
+                 startup_timeout_s: float):
         self._ip = ip
         self._port = port
         self._ssl_context = ssl_context
         self._ip_whitelist = ip_whitelist
+        self._metrics_ip_whitelist = metrics_ip_whitelist
         self._webhook_queue = webhook_queue
+        self._metrics = webhook_metrics
+        self._ingress_settings = ingress_settings
+        self._liveness_check_interval_s = liveness_check_interval_s
+        self._heartbeat_timeout_s = heartbeat_timeout_s
+        self._startup_timeout_s = startup_timeout_s
 
         self._server_process = None
+        self._heartbeat = None
+        self._server_lock = threading.Lock()
+
+        self._last_handover_s: float | None = None
+
+        self._retiring_threads: list[threading.Thread] = []
 
         self._stop_event = threading.Event()
 
         self._server_checker_thread = threading.Thread(target=self._server_checker)
 
+    @property
+    def last_handover_s(self) -> float | None:
+        return self._last_handover_s
+
     def start(self):
-        self._run_flask()
+        with self._server_lock:
+            self._server_process, self._heartbeat, _ = self._run_flask()
 
         self._server_checker_thread.start()
 
+    def restart(self):
+        with self._server_lock:
+            self._handover()
+
     def stop(self):
         self._stop_event.set()
 
@@ -108,78 +285,135 @@ class WebhookServerManager:
 
         logging.info(f"Server checker stopped.")
 
-        if self._server_process is not None and self._server_process.is_alive():
-            self._server_process.terminate()
+        with self._server_lock:
+            if self._server_process is not None:
+                self._retire(self._server_process)
+
+            retiring_threads, self._retiring_threads = self._retiring_threads, []
 
-            self._server_process.join()
+        for thread in retiring_threads:
+            thread.join()
 
         logging.info(f"Server process stopped.")
 
-    def _run_flask(self):
+    def _run_flask(self) -> tuple[multiprocessing.Process, multiprocessing.Value, bool]:
         st = time.time()
 
-        self._server_process = multiprocessing.Process(
+        ready_event = multiprocessing.Event()
+        heartbeat = multiprocessing.RawValue("Q", 0)
+
+        server_process = multiprocessing.Process(
             target=WebhookServer.run_flask,
-            args=(self._ip, self._port, self._ssl_context, self._ip_whitelist, self._webhook_queue))
+            args=(self._ip,
+                  self._port,
+                  self._ssl_context,
+                  self._ip_whitelist,
+                  self._metrics_ip_whitelist,
+                  self._webhook_queue,
+                  self._metrics,
+                  self._ingress_settings,
+                  ready_event,
+                  heartbeat))
+
+        server_process.start()
+
+        while not ready_event.wait(timeout=0.05):
+            if not server_process.is_alive() or time.time() - st > self._startup_timeout_s:
+                logging.error(f"Something went wrong during starting server!")
+
+                return server_process, heartbeat, False
 
-        self._server_process.start()
+        logging.info(f"Server started in {(time.time() - st):.2f}s!")
 
-        max_attempts, attempt = 20, 0
+        return server_process, heartbeat, True
 
-        while attempt < max_attempts:
-            try:
-                requests.get(f"https://{self._ip}:{self._port}/ping",
-                             verify=False,
-                             timeout=10)
+    def _retire(self, server_process: multiprocessing.Process):
+        if server_process.is_alive():
+            server_process.terminate()
 
-                logging.info(f"Server started in {(time.time() - st):.2f}s!")
+            server_process.join(timeout=self._ingress_settings.drain_timeout_s + 5)
 
-                return
-            except Exception:
-                time.sleep(0.5)
+        if server_process.is_alive():
+            logging.error(f"Server process {server_process.pid} did not drain in time, killing...")
 
-                attempt += 1
+            server_process.kill()
+
+            server_process.join()
+
+    def _retire_async(self, server_process: multiprocessing.Process):
+        thread = threading.Thread(target=self._retire, args=(server_process,), daemon=True)
+
+        thread.start()
+
+        self._retiring_threads = [t for t in self._retiring_threads if t.is_alive()] + [thread]
+
+    @staticmethod
+    def _kill(server_process: multiprocessing.Process):
+        if server_process.is_alive():
+            server_process.kill()
+
+        server_process.join()
+
+    def _handover(self, exited: bool = False, stalled: bool = False):
+        st = time.time()
 
-        logging.error(f"Something went wrong during starting server!")
+        old_server_process = self._server_process
+
+        if exited and old_server_process is not None:
+            self._kill(old_server_process)
+
+        server_process, heartbeat, is_ready = self._run_flask()
+
+        if not is_ready and old_server_process is not None and old_server_process.is_alive():
+            logging.error("Replacement server is not ready, keeping the current one.")
+
+            self._kill(server_process)
+
+            return
+
+        self._server_process, self._heartbeat = server_process, heartbeat
+
+        if old_server_process is not None and stalled:
+            self._kill(old_server_process)
+        elif old_server_process is not None and not exited:
+            self._retire_async(old_server_process)
+
+        self._last_handover_s = time.time() - st
+
+        logging.info(f"Server handover completed in {self._last_handover_s:.2f}s!")
 
     def _server_checker(self):
+        last_heartbeat, last_heartbeat_at = None, time.monotonic()
+
         while not self._stop_event.is_set():
             restart_server = False
 
-            try:
-                logging.info("Sending ping to server...")
-
-                response = \
-                    requests.get(f"https://{self._ip}:{self._port}/ping",
-                                 verify=False,
-                                 timeout=10)
+            exited = multiprocessing.connection.wait([self._server_process.sentinel],
+                                                     timeout=self._liveness_check_interval_s)
 
-                logging.info("Ping response received from server.")
+            if self._stop_event.is_set():
+                break
 
-                if response.status_code == 200 and response.text == "pong":
-                    logging.info("Server is up!")
-                else:
-                    restart_server = True
+            if exited:
+                restart_server = True
 
-                    logging.error("Server is down, restarting...")
-            except requests.RequestException as ex:
+                logging.error(f"Server process exited with code {self._server_process.exitcode}, restarting...")
+            elif self._heartbeat.value != last_heartbeat:
+                last_heartbeat, last_heartbeat_at = self._heartbeat.value, time.monotonic()
+            elif time.monotonic() - last_heartbeat_at > self._heartbeat_timeout_s:
                 restart_server = True
 
-                logging.error(f"Error pinging server: {ex.__class__.__name__} {ex}, restarting server...")
+                logging.error(f"Server heartbeat stalled for {time.monotonic() - last_heartbeat_at:.2f}s, "
+                              f"restarting...")
 
             if restart_server:
                 try:
-                    logging.info(f"Termination of server process started...")
-
-                    if self._server_process is not None and self._server_process.is_alive():
-                        self._server_process.terminate()
-
-                        self._server_process.join()
-
-                    logging.info(f"Termination of server process ended!")
-
-                    self._run_flask()
+                    with self._server_lock:
+                        self._handover(exited=bool(exited), stalled=not exited)
                 except Exception:
                     traceback.print_exc()
 
-            time.sleep(10)
+                if not self._server_process.is_alive():
+                    self._stop_event.wait(1)
+
+                last_heartbeat, last_heartbeat_at = None, time.monotonic()
@@ -0,0 +1,115 @@
+from tinkoff.invest import StopOrderType, StopOrderStatusOption
+from collections import defaultdict
+import threading
+import logging
+import time
+
+import client_pool
+
+
+class StopOrderIndex:
+    def __init__(self, client_pool: client_pool.ClientPool, reconcile_interval_s: float):
+        self._client_pool = client_pool
+        self._reconcile_interval_s = reconcile_interval_s
+
+        self._account_id = None
+
+        self._stop_orders: dict[str, dict[StopOrderType, set[str]]] = {}
+        self._updated_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self._is_synced = False
+
+        self._stop_event = threading.Event()
+
+        self._reconciler_thread = threading.Thread(target=self._reconciler)
+
+    @property
+    def is_synced(self) -> bool:
+        return self._is_synced
+
+    def start(self, account_id: str):
+        self._account_id = account_id
+
+        self._reconciler_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+        if self._reconciler_thread.is_alive():
+            self._reconciler_thread.join()
+
+    def get(self, uid: str, stop_order_type: StopOrderType | None = None) -> list[str] | None:
+        if not self._is_synced:
+            return None
+
+        with self._lock:
+            by_type = self._stop_orders.get(uid, {})
+
+            if stop_order_type is not None:
+                return list(by_type.get(stop_order_type, ()))
+
+            return [stop_order_id for stop_order_ids in by_type.values() for stop_order_id in stop_order_ids]
+
+    def add(self, uid: str, stop_order_type: StopOrderType, stop_order_id: str):
+        with self._lock:
+            self._stop_orders.setdefault(uid, {}).setdefault(stop_order_type, set()).add(stop_order_id)
+
+            self._updated_at[uid] = time.monotonic()
+
+    def remove(self, uid: str, stop_order_id: str):
+        with self._lock:
+            by_type = self._stop_orders.get(uid, {})
+
+            for stop_order_type in list(by_type):
+                by_type[stop_order_type].discard(stop_order_id)
+
+                if not by_type[stop_order_type]:
+                    del by_type[stop_order_type]
+
+            if not by_type:
+                self._stop_orders.pop(uid, None)
+
+            self._updated_at[uid] = time.monotonic()
+
+    def refresh(self, client):
+        st = time.monotonic()
+
+        response = client.stop_orders.get_stop_orders(account_id=self._account_id,
+                                                      status=StopOrderStatusOption.STOP_ORDER_STATUS_ACTIVE)
+
+        stop_orders = defaultdict(dict)
+
+        for stop_order in response.stop_orders:
+            stop_orders[stop_order.instrument_uid].setdefault(stop_order.order_type, set()).add(
+                stop_order.stop_order_id)
+
+        drift = []
+
+        with self._lock:
+            for uid in set(self._stop_orders) | set(stop_orders):
+                if self._updated_at.get(uid, 0) > st:
+                    continue
+
+                if self._is_synced and self._stop_orders.get(uid, {}) != stop_orders.get(uid, {}):
+                    drift.append(uid)
+
+                if uid in stop_orders:
+                    self._stop_orders[uid] = stop_orders[uid]
+                else:
+                    self._stop_orders.pop(uid, None)
+
+            self._is_synced = True
+
+        if drift:
+            logging.info(f"Stop order index reconciled, changed instruments: {drift}")
+
+    def _reconciler(self):
+        while not self._stop_event.is_set():
+            try:
+                with self._client_pool.client() as client:
+                    self.refresh(client)
+            except Exception as ex:
+                logging.error(f"Error reconciling stop order index: {ex.__class__.__name__} {ex}")
+
+            self._stop_event.wait(self._reconcile_interval_s)
@@ -0,0 +1,108 @@
+import threading
+import logging
+import queue
+import time
+import os
+
+import utils
+
+
+class TickerRegistry:
+    def __init__(self, filename: str, compact_interval_s: float):
+        self._filename = filename
+        self._compact_interval_s = compact_interval_s
+
+        self._tickers: frozenset[str] = frozenset()
+        self._lock = threading.Lock()
+
+        self._journal_queue = queue.Queue()
+        self._needs_compaction = False
+
+        self._stop_event = threading.Event()
+
+        self._journal_writer_thread = threading.Thread(target=self._journal_writer)
+
+    @property
+    def tickers(self) -> frozenset[str]:
+        return self._tickers
+
+    def start(self):
+        self._tickers = frozenset(ticker for ticker in utils.get_all_elements(self._filename) if ticker)
+
+        self._needs_compaction = True
+
+        self._journal_writer_thread.start()
+
+        logging.info(f"Ticker registry loaded: {len(self._tickers)} tickers.")
+
+    def stop(self):
+        self._stop_event.set()
+
+        if self._journal_writer_thread.is_alive():
+            self._journal_writer_thread.join()
+
+    def add(self, ticker: str) -> bool:
+        if ticker in self._tickers:
+            return False
+
+        with self._lock:
+            if ticker in self._tickers:
+                return False
+
+            self._tickers = self._tickers | {ticker}
+
+        self._journal_queue.put(ticker)
+
+        return True
+
+    def _append(self, tickers: list[str]):
+        with open(self._filename, "a") as file:
+            for ticker in tickers:
+                file.write("%s\n" % ticker)
+
+    def _compact(self):
+        tmp_filename = f"{self._filename}.tmp"
+
+        with open(tmp_filename, "w") as file:
+            for ticker in sorted(self._tickers):
+                file.write("%s\n" % ticker)
+
+        os.replace(tmp_filename, self._filename)
+
+    def _drain_journal_queue(self) -> list[str]:
+        tickers = []
+
+        while True:
+            try:
+                tickers.append(self._journal_queue.get_nowait())
+            except queue.Empty:
+                return tickers
+
+    def _journal_writer(self):
+        compact_at = time.monotonic() + self._compact_interval_s
+
+        while True:
+            try:
+                tickers = [self._journal_queue.get(timeout=1)]
+            except queue.Empty:
+                tickers = []
+
+            tickers += self._drain_journal_queue()
+
+            try:
+                if tickers:
+                    self._append(tickers)
+
+                    self._needs_compaction = True
+
+                if self._needs_compaction and (time.monotonic() >= compact_at or self._stop_event.is_set()):
+                    self._compact()
+
+                    self._needs_compaction = False
+
+                    compact_at = time.monotonic() + self._compact_interval_s
+            except Exception as ex:
+                logging.error(f"Error writing tickers journal: {ex.__class__.__name__} {ex}")
+
+            if self._stop_event.is_set() and self._journal_queue.empty():
+                return
@@ -0,0 +1,89 @@
+from typing import NamedTuple
+import threading
+import cachetools
+
+import instrument_records
+import utils
+
+
+class _Index(NamedTuple):
+    aliases: dict[str, tuple[str, instrument_records.InstrumentRecord]]
+    cache: cachetools.LRUCache
+
+
+class TickerResolver:
+    EXCHANGE_PREFIXES = ("MOEX", "RUS")
+
+    def __init__(self, currency: str, cache_size: int):
+        self._currency = currency
+        self._cache_size = cache_size
+
+        self._index = _Index({}, cachetools.LRUCache(maxsize=cache_size))
+        self._cache_lock = threading.Lock()
+
+    @property
+    def aliases_count(self) -> int:
+        return len(self._index.aliases)
+
+    def rebuild(self, instruments_by_uid: dict[str, instrument_records.InstrumentRecord]):
+        aliases = {}
+
+        for instrument in instruments_by_uid.values():
+            if instrument.currency != self._currency:
+                continue
+
+            entry = (instrument.ticker, instrument)
+
+            for alias in self._get_aliases(instrument):
+                aliases.setdefault(alias, entry)
+
+                for exchange in self.EXCHANGE_PREFIXES:
+                    aliases.setdefault(f"{exchange}:{alias}", entry)
+
+        self._index = _Index(aliases, cachetools.LRUCache(maxsize=self._cache_size))
+
+    def resolve(self, raw_ticker: str) -> tuple[str, instrument_records.InstrumentRecord | None]:
+        index = self._index
+
+        entry = index.aliases.get(raw_ticker)
+
+        if entry is not None:
+            return entry
+
+        with self._cache_lock:
+            entry = index.cache.get(raw_ticker)
+
+        if entry is not None:
+            return entry
+
+        ticker = self.normalize(raw_ticker)
+
+        entry = index.aliases.get(ticker, (ticker, None))
+
+        with self._cache_lock:
+            index.cache[raw_ticker] = entry
+
+        return entry
+
+    @staticmethod
+    def normalize(raw_ticker: str) -> str:
+        split_ticker = raw_ticker.split(":")
+
+        if len(split_ticker) > 1:
+            raw_ticker = split_ticker[1]
+
+        return utils.reduce_year_from_string(raw_ticker)
+
+    @staticmethod
+    def _get_aliases(instrument: instrument_records.InstrumentRecord) -> list[str]:
+        aliases = [instrument.ticker]
+
+        expiration_date = instrument.expiration_date
+
+        if expiration_date is not None and expiration_date.year > 1970:
+            year = str(expiration_date.year)
+
+            if instrument.ticker.endswith(year[-1]):
+                aliases.append(instrument.ticker[:-1] + year)
+
+        return aliases
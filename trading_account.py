@@ -0,0 +1,79 @@
+import logging
+
+import stop_order_index
+import position_book
+import margin_engine
+import order_tracker
+import client_pool
+import tinkoff_utils as tu
+import logger
+
+
+class TradingAccount:
+    def __init__(self,
+                 name: str,
+                 tag: str,
+                 pool: client_pool.ClientPool,
+                 trades_stream_reconnect_delay_s: float,
+                 positions_stream_reconnect_delay_s: float,
+                 positions_reconcile_interval_s: float,
+                 margin_reconcile_interval_s: float,
+                 margin_reconcile_after_fills: int,
+                 margin_max_age_s: float,
+                 stop_orders_reconcile_interval_s: float,
+                 tg_logger: logger.TgLogger):
+        self.name = name
+        self.tag = tag
+        self.id = None
+
+        self._client_pool = pool
+
+        self.order_tracker = order_tracker.OrderTracker(pool, trades_stream_reconnect_delay_s, 60)
+
+        self.position_book = position_book.PositionBook(pool,
+                                                        positions_reconcile_interval_s,
+                                                        positions_stream_reconnect_delay_s,
+                                                        tg_logger)
+
+        self.margin_engine = margin_engine.MarginEngine(pool,
+                                                        margin_reconcile_interval_s,
+                                                        margin_reconcile_after_fills,
+                                                        margin_max_age_s)
+
+        self.stop_order_index = stop_order_index.StopOrderIndex(pool, stop_orders_reconcile_interval_s)
+
+    def start(self):
+        with self._client_pool.client() as client:
+            account_id = tu.get_account_id(client, self.name)
+
+        if account_id is None:
+            raise tu.AccountNotFoundException(f"Account '{self.name}' not found!")
+
+        self.id = account_id
+
+        self.order_tracker.start(account_id)
+
+        self.position_book.start(account_id)
+
+        self.margin_engine.start(account_id)
+
+        self.stop_order_index.start(account_id)
+
+        logging.info(f"Account '{self.name}' started.")
+
+    def stop(self):
+        self.order_tracker.stop()
+
+        logging.info(f"Order tracker of '{self.name}' stopped.")
+
+        self.position_book.stop()
+
+        logging.info(f"Position book of '{self.name}' stopped.")
+
+        self.margin_engine.stop()
+
+        logging.info(f"Margin engine of '{self.name}' stopped.")
+
+        self.stop_order_index.stop()
+
+        logging.info(f"Stop order index of '{self.name}' stopped.")
@@ -1,12 +1,13 @@
 from datetime import datetime as dt, timedelta
 from decimal import Decimal
 from enum import Enum
+import multiprocessing
 import traceback
-import threading
 import requests
+import logging
 import math
-import pytz
 import re
+import os
 
 
 class BaseEnum(str, Enum):
@@ -19,6 +20,52 @@ class BaseEnum(str, Enum):
             raise ValueError(f"{cls.__name__} enum not found for {value}")
 
 
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+class RecoverableLock:
+    def __init__(self, name: str, timeout_s: float = 1.0):
+        self._name = name
+        self._timeout_s = timeout_s
+
+        self._lock = multiprocessing.Lock()
+        self._owner = multiprocessing.RawValue("q", 0)
+
+    def __enter__(self):
+        while not self._lock.acquire(timeout=self._timeout_s):
+            owner = self._owner.value
+
+            if owner == 0 or is_process_alive(owner):
+                continue
+
+            logging.error(f"{self._name} lock holder {owner} is gone, recovering the lock.")
+
+            if self._owner.value == owner:
+                self._owner.value = 0
+
+                try:
+                    self._lock.release()
+                except ValueError:
+                    pass
+
+        self._owner.value = os.getpid()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._owner.value = 0
+
+        self._lock.release()
+
+
 def send_post_ss(session: requests.Session, url, data, files=None):
     try:
         response = session.post(url, data, files=files)
@@ -35,8 +82,7 @@ def send_tg(session: requests.Session,
             bot_token: str,
             chat_id: str,
             text: str,
-            parse_mode: str = None,
-            send_async: bool = True):
+            parse_mode: str = None):
     url = "https://api.telegram.org/bot" + bot_token + "/sendMessage"
 
     data = {
@@ -47,10 +93,7 @@ def send_tg(session: requests.Session,
     if parse_mode is not None:
         data["parse_mode"] = parse_mode
 
-    if send_async:
-        threading.Thread(target=send_post_ss, args=(session, url, data)).start()
-    else:
-        return send_post_ss(session, url, data)
+    return send_post_ss(session, url, data)
 
 
 def send_document(session: requests.Session,
@@ -58,8 +101,7 @@ def send_document(session: requests.Session,
                   chat_id: str,
                   document: bytes,
                   filename: str,
-                  caption: str = None,
-                  send_async: bool = True):
+                  caption: str = None):
     url = "https://api.telegram.org/bot" + bot_token + "/sendDocument"
 
     data = {
@@ -73,10 +115,7 @@ def send_document(session: requests.Session,
     if caption is not None:
         data["caption"] = caption
 
-    if send_async:
-        threading.Thread(target=send_post_ss, args=(session, url, data, files)).start()
-    else:
-        return send_post_ss(session, url, data, files)
+    return send_post_ss(session, url, data, files)
 
 
 def reduce_year_from_string(input_string):
@@ -88,29 +127,17 @@ def reduce_year_from_string(input_string):
     return input_string
 
 
-def round_price(price: Decimal, tick_size: Decimal):
-    return round(math.floor(price / tick_size) * tick_size,
-                 len(decimal_to_string(tick_size).split('.')[1]))
+def round_price(price: Decimal, tick_size: Decimal, decimals: int | None = None):
+    if decimals is None:
+        decimals = len(decimal_to_string(tick_size).split('.')[1])
+
+    return round(math.floor(price / tick_size) * tick_size, decimals)
 
 
 def decimal_to_string(val: Decimal):
     return format(Decimal(str(val)), "f")
 
 
-def add_to_set(file_path, element):
-    try:
-        with open(file_path, "r") as file:
-            elements = set(file.read().splitlines())
-    except FileNotFoundError:
-        elements = set()
-
-    elements.add(element)
-
-    with open(file_path, "w") as file:
-        for item in elements:
-            file.write("%s\n" % item)
-
-
 def get_all_elements(file_path):
     try:
         with open(file_path, "r") as file:
@@ -121,34 +148,35 @@ def get_all_elements(file_path):
         return set()
 
 
-def is_within_time_window(current_time, windows):
-    for window_start, window_end in windows:
-        if window_start <= current_time < window_end:
-            return True, window_end
-
-    return False, None
-
-
-def get_utc_time_windows(windows_str):
-    utc_now = dt.now(pytz.utc)
+def compile_time_windows(windows_str: list[str]) -> list[tuple[int, int]]:
     windows = []
 
     for window in windows_str:
         start, end = window.split("-")
 
-        start_dt = utc_now.replace(hour=int(start.split(":")[0]),
-                                   minute=int(start.split(":")[1]),
-                                   second=int(start.split(":")[2]),
-                                   microsecond=0)
+        windows.append((time_str_to_seconds(start), time_str_to_seconds(end)))
+
+    return windows
 
-        end_dt = utc_now.replace(hour=int(end.split(":")[0]),
-                                 minute=int(end.split(":")[1]),
-                                 second=int(start.split(":")[2]),
-                                 microsecond=0)
 
-        if end_dt <= start_dt:
-            end_dt += timedelta(days=1)
+def time_str_to_seconds(time_str: str) -> int:
+    hours, minutes, seconds = time_str.split(":")
 
-        windows.append((start_dt, end_dt))
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
 
-    return windows
+
+def get_time_window_end(current_time: dt, windows: list[tuple[int, int]]) -> dt | None:
+    midnight = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    seconds = (current_time - midnight).total_seconds()
+
+    for start, end in windows:
+        if start < end:
+            if start <= seconds < end:
+                return midnight + timedelta(seconds=end)
+        elif seconds >= start:
+            return midnight + timedelta(days=1, seconds=end)
+        elif seconds < end:
+            return midnight + timedelta(seconds=end)
+
+    return None